@@ -1,15 +1,61 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, List, Optional
 import uvicorn
-from download_thread import DownloadThread
+from bandwidth import bandwidth_manager
+from batch import PREFETCH_AHEAD, expand_playlist, info_prefetcher
+from download import YouTubeDownloader
+from download_archive import archive_id, get_archive
+from download_engine import DownloadJob, job_key
+from download_journal import get_journal, resume_options
+from download_scheduler import DownloadScheduler
+from history_manager import HistoryManager
+from event_stream import EventBroker, format_sse
+import metrics
+from postprocess_pool import DEFAULT_PROCESSES, postprocess_pool
+from process_workers import ProcessWorkerPool
+from subscriptions import get_subscriptions
+from task_store import TaskStore
+from turbo import DEFAULT_MAX_CHUNK_SIZE, DEFAULT_MAX_FRAGMENTS
+from utils import parse_size
+import argparse
 import asyncio
 import os
 
-app = FastAPI(title="YouTube Downloader API")
+def load_archive():
+    """打开下载存档，第一次使用时从桌面端的下载历史导入"""
+    archive = get_archive()
+    if archive.needs_backfill():
+        imported = archive.backfill(HistoryManager().load_history())
+        print(f"已从下载历史导入 {imported} 条下载存档")
+    # 提前编译各提取器的URL规则，避免第一次检查存档时阻塞事件循环
+    archive_id('about:blank')
+
+@asynccontextmanager
+async def lifespan(app):
+    broker.bind(asyncio.get_running_loop())
+    if worker_pool:
+        worker_pool.start()
+    scheduler.start()
+    recover_tasks()
+    # 第一次导入下载存档可能较慢，在后台进行
+    archive_task = asyncio.create_task(asyncio.to_thread(load_archive))
+    prune_task = asyncio.create_task(prune_tasks_periodically())
+    yield
+    prune_task.cancel()
+    archive_task.cancel()
+    await scheduler.stop()
+    info_prefetcher.shutdown()
+    if worker_pool:
+        await asyncio.to_thread(worker_pool.stop)
+    await asyncio.to_thread(postprocess_pool.shutdown)
+
+app = FastAPI(title="YouTube Downloader API", lifespan=lifespan)
 
 class DownloadRequest(BaseModel):
     url: str
@@ -18,163 +64,580 @@ class DownloadRequest(BaseModel):
     subtitle: bool = False
     proxy: Optional[str] = None
     speed_limit: Optional[str] = None
+    priority: int = 0  # 数值越大越优先
+    bandwidth_weight: float = 1.0  # 全局带宽预算中的分配权重
+    parallel_streams: bool = True  # 合并格式的视频流和音频流同时下载
+    turbo: bool = False  # 加速模式：并行下载分片并自动调节
+    turbo_max_fragments: int = DEFAULT_MAX_FRAGMENTS  # 加速模式的最大并发分片数
+    turbo_max_chunk_size: Optional[str] = None  # 加速模式的最大分块大小，如 "16M"
+    force: bool = False  # 已以相同格式下载过时仍重新下载
 
 class DownloadResponse(BaseModel):
     task_id: str
     status: str
     message: str
     file_path: Optional[str] = None
+    version: Optional[int] = None
+    progress: Optional[int] = None  # 下载百分比
+
+class PlaylistDownloadRequest(DownloadRequest):
+    max_entries: Optional[int] = None  # 最多下载的条目数，为空表示全部
+
+class PlaylistResponse(BaseModel):
+    batch_id: str
+    title: Optional[str] = None
+    total: int
+    progress: int  # 整体完成百分比
+    counts: Dict[str, int] = {}  # 各状态的条目数
+    tasks: List[DownloadResponse] = []
+
+class SubscriptionRequest(DownloadRequest):
+    download_existing: bool = False  # 第一次同步时是否下载频道中已有的视频
+
+class SubscriptionResponse(BaseModel):
+    id: str
+    url: str
+    title: Optional[str] = None
+    format: Optional[str] = None
+    output_dir: Optional[str] = None
+    entry_count: int  # 已记录的视频数
+    latest_upload_date: Optional[str] = None
+    last_synced_at: Optional[float] = None
+    created_at: float
+
+class SyncResponse(BaseModel):
+    subscription_id: str
+    new_entries: int  # 新发现的视频数
+    scanned: int  # 本次同步检查的条目数
+    elapsed: float  # 同步耗时(秒)
+    batch: Optional[PlaylistResponse] = None  # 新视频的下载批次
+
+class BandwidthSettings(BaseModel):
+    limit: Optional[str] = None  # 如 "5M"，为空表示不限速
+
+class BatchStatusRequest(BaseModel):
+    task_ids: Optional[List[str]] = None
+    since: Optional[int] = None  # 只返回版本号大于since的任务
 
-# 存储下载任务的字典
-download_tasks = {}
+class BatchStatusResponse(BaseModel):
+    version: int
+    tasks: List[DownloadResponse]
+    missing: List[str] = []
+
+# 持久化的任务存储
+task_store = TaskStore()
+
+# 正在运行的下载任务，任务结束后移除
+active_jobs = {}
+
+# 多进程模式下的worker进程池，为None时在API进程的线程中下载
+worker_pool = None
+# 后处理进程数，0表示在下载线程中直接执行后处理
+postprocess_workers = DEFAULT_PROCESSES
+
+# 任务事件广播器，供 /api/v1/events 推送
+broker = EventBroker(progress_interval=0.5)
+
+def update_task(task_id: str, **fields):
+    """更新任务字段并递增版本号，下载线程回调中也会调用"""
+    task = task_store.update(task_id, **fields)
+    
+    # 状态变化立即推送，进度消息由progress事件合并推送
+    if 'status' in fields:
+        response = task_response(task)
+        broker.publish(response.status, task_id, response.model_dump())
+    return task
+
+def task_response(task: dict):
+    return DownloadResponse(
+        task_id=task['id'],
+        status=task['status'],
+        message=task['message'],
+        file_path=task['file_path'],
+        version=task['version'],
+        progress=task.get('progress')
+    )
+
+def subscription_response(subscription: dict):
+    return SubscriptionResponse(
+        id=subscription['id'],
+        url=subscription['url'],
+        title=subscription['title'],
+        format=subscription['format'],
+        output_dir=subscription['output_dir'],
+        entry_count=subscription['entry_count'],
+        latest_upload_date=subscription['latest_upload_date'] or None,
+        last_synced_at=subscription['last_synced_at'],
+        created_at=subscription['created_at']
+    )
+
+def playlist_response(batch: dict, tasks=()):
+    return PlaylistResponse(
+        batch_id=batch['id'],
+        title=batch['title'],
+        total=batch['total'],
+        progress=batch['progress'],
+        counts=batch['counts'],
+        tasks=[task_response(task) for task in tasks]
+    )
+
+async def run_task(task_id: str):
+    """调度器worker执行单个任务"""
+    task = task_store.get(task_id)
+    if task:
+        if task['batch_id'] and worker_pool is None:
+            # 预取同一批次中接下来要下载的条目；多进程模式下缓存不在同一进程，不预取
+            upcoming = task_store.find_by_batch(task['batch_id'], status='queued', limit=PREFETCH_AHEAD)
+            info_prefetcher.prefetch([item['url'] for item in upcoming], task['options'])
+        await download_video(task_id, task['url'], task['options'])
+
+def recover_tasks():
+    """服务启动时恢复上次未完成的任务
+
+    中断的下载重新排队，使用下载日志中记录的格式从 .part 文件断点续传。
+    """
+    journal = get_journal()
+    entries = {entry['job_id']: entry for entry in journal.pending('api')}
+    for task in task_store.find_by_status('queued', 'downloading'):
+        entry = entries.pop(task['id'], None)
+        if task['status'] == 'downloading':
+            fields = dict(status='queued', message='服务重启，继续未完成的下载')
+            if entry:
+                fields['options'] = resume_options(entry)
+            update_task(task['id'], **fields)
+        scheduler.submit(task['id'], task['priority'])
+    # 任务记录已不存在或已结束的日志不再需要
+    for job_id in entries:
+        journal.remove(job_id)
+
+async def prune_tasks_periodically(interval=3600):
+    """定期清理过期的已结束任务"""
+    while True:
+        deleted = await asyncio.to_thread(task_store.prune)
+        if deleted:
+            print(f"已清理 {deleted} 个过期任务")
+        await asyncio.sleep(interval)
+
+# 下载任务调度器，限制同时下载的任务数
+scheduler = DownloadScheduler(run_task, max_workers=3)
+metrics.queue_depth.set_function(lambda: scheduler.queue_depth)
+metrics.active_workers.set_function(lambda: scheduler.active_count)
+
+def turbo_chunk_size(request: DownloadRequest):
+    """校验加速模式参数，返回最大分块大小(字节)"""
+    max_chunk_size = DEFAULT_MAX_CHUNK_SIZE
+    if request.turbo_max_chunk_size:
+        max_chunk_size = parse_size(request.turbo_max_chunk_size)
+        if not max_chunk_size:
+            raise HTTPException(status_code=400, detail="无效的分块大小")
+    if request.turbo_max_fragments < 1:
+        raise HTTPException(status_code=400, detail="并发分片数必须大于0")
+    return max_chunk_size
+
+def build_download_options(request: DownloadRequest, output_dir: str, max_chunk_size: int):
+    """准备下载选项，与桌面端使用相同的格式配置"""
+    subtitle_options = {'enabled': True} if request.subtitle else None
+    ydl_opts = YouTubeDownloader.prepare_download_options(
+        request.format,
+        output_dir,
+        subtitle_options,
+        request.speed_limit,
+        request.proxy,
+        enable_logging=False
+    )
+    ydl_opts['bandwidth_weight'] = request.bandwidth_weight
+    ydl_opts['archive_profile'] = request.format
+    ydl_opts['parallel_streams'] = request.parallel_streams
+    if request.turbo:
+        ydl_opts['turbo'] = True
+        ydl_opts['turbo_max_fragments'] = request.turbo_max_fragments
+        ydl_opts['turbo_max_chunk_size'] = max_chunk_size
+    return ydl_opts
+
+def enqueue_task(url: str, ydl_opts: dict, priority: int, key: str, batch_id=None, force=False):
+    """创建下载任务并加入调度队列，由worker按优先级执行
+
+    已以相同格式下载过的视频不做任何提取，直接记录为跳过，force为真时仍重新下载。
+    """
+    if not force and get_archive().contains(url, ydl_opts.get('archive_profile')):
+        task = task_store.create(url, ydl_opts, priority, status='skipped', message='已下载过，跳过',
+                                 job_key=key, batch_id=batch_id)
+        broker.publish(task['status'], task['id'], task_response(task).model_dump())
+        return task
+    task = task_store.create(url, ydl_opts, priority, job_key=key, batch_id=batch_id)
+    broker.publish(task['status'], task['id'], task_response(task).model_dump())
+    scheduler.submit(task['id'], priority)
+    return task
 
 @app.post("/api/v1/download", response_model=DownloadResponse)
 async def start_download(request: DownloadRequest):
+    max_chunk_size = turbo_chunk_size(request)
+    
     try:
-        # 生成任务ID
-        task_id = f"task_{len(download_tasks) + 1}"
+        output_dir = request.output_dir or os.path.expanduser("~/Movies/yt-dlp")
         
-        # 准备下载选项
-        ydl_opts = {
-            'outtmpl': os.path.join(
-                request.output_dir or os.path.expanduser("~/Movies/yt-dlp"),
-                '%(title)s.%(ext)s'
-            ),
-        }
+        ydl_opts = build_download_options(request, output_dir, max_chunk_size)
         
-        # 设置格式
-        if request.format == "最佳质量":
-            ydl_opts['format'] = 'bestvideo+bestaudio/best'
-            ydl_opts['merge_output_format'] = 'mp4'
-        elif request.format == "仅音频 (MP3)":
-            ydl_opts['format'] = 'bestaudio/best'
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }]
-            
-        # 设置字幕
-        if request.subtitle:
-            ydl_opts['writesubtitles'] = True
-            ydl_opts['writeautomaticsub'] = True
-            
-        # 设置代理
-        if request.proxy:
-            ydl_opts['proxy'] = request.proxy
-            
-        # 设置速度限制
-        if request.speed_limit:
-            ydl_opts['ratelimit'] = request.speed_limit
-            
-        # 创建下载任务
-        download_tasks[task_id] = {
-            'status': 'pending',
-            'message': '等待下载',
-            'file_path': None,
-            'thread': None
-        }
+        # 相同的视频、格式和下载选项已在排队或下载中时，直接合并到已有任务
+        key = job_key(request.url, request.format, output_dir, ydl_opts)
+        existing = task_store.find_active(key)
+        if existing:
+            return DownloadResponse(
+                task_id=existing['id'],
+                status=existing['status'],
+                message='已合并到进行中的相同任务',
+                version=existing['version']
+            )
         
-        # 启动下载线程
-        asyncio.create_task(download_video(task_id, request.url, ydl_opts))
+        task = enqueue_task(request.url, ydl_opts, request.priority, key, force=request.force)
+        if task['status'] == 'skipped':
+            return task_response(task)
         
         return DownloadResponse(
-            task_id=task_id,
-            status='pending',
-            message='下载任务已创建',
+            task_id=task['id'],
+            status='queued',
+            message='下载任务已加入队列',
+            version=task['version']
         )
-        
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def enqueue_batch(url, title, entries, ydl_opts, format_option, output_dir, priority, force=False):
+    """把列表条目作为一个批次加入队列，返回批次状态；没有需要下载的条目时返回None"""
+    # 已在排队或下载中的相同条目不重复创建
+    entries = [entry for entry in entries
+               if not task_store.find_active(job_key(entry['url'], format_option, output_dir, ydl_opts))]
+    if not entries:
+        return None
+    
+    batch_id = task_store.create_batch(url, title, len(entries))
+    tasks = [
+        enqueue_task(entry['url'], ydl_opts, priority,
+                     job_key(entry['url'], format_option, output_dir, ydl_opts), batch_id, force)
+        for entry in entries
+    ]
+    if worker_pool is None:
+        queued = [task['url'] for task in tasks if task['status'] == 'queued']
+        info_prefetcher.prefetch(queued[:PREFETCH_AHEAD], ydl_opts)
+    return playlist_response(task_store.get_batch(batch_id), tasks)
+
+@app.post("/api/v1/playlist", response_model=PlaylistResponse)
+async def start_playlist_download(request: PlaylistDownloadRequest):
+    """下载播放列表或频道：平铺展开后每个条目作为一个任务排队"""
+    max_chunk_size = turbo_chunk_size(request)
+    output_dir = request.output_dir or os.path.expanduser("~/Movies/yt-dlp")
+    ydl_opts = build_download_options(request, output_dir, max_chunk_size)
+    
+    try:
+        playlist = await asyncio.to_thread(expand_playlist, request.url, ydl_opts)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"展开播放列表失败: {str(e)}")
+    if playlist is None:
+        raise HTTPException(status_code=400, detail="URL不是播放列表或频道")
+    
+    entries = playlist['entries'][:request.max_entries] if request.max_entries else playlist['entries']
+    batch = enqueue_batch(request.url, playlist['title'], entries, ydl_opts,
+                          request.format, output_dir, request.priority, request.force)
+    if batch is None:
+        raise HTTPException(status_code=400, detail="播放列表中没有需要下载的视频")
+    return batch
+
+@app.get("/api/v1/playlist/{batch_id}", response_model=PlaylistResponse)
+async def get_playlist_status(batch_id: str, include_tasks: bool = True):
+    """批次的汇总状态，include_tasks为真时附带每个条目的状态和进度"""
+    batch = task_store.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="批次不存在")
+    tasks = task_store.find_by_batch(batch_id) if include_tasks else ()
+    return playlist_response(batch, tasks)
+
+async def sync_subscription(subscription_id: str, priority: int = 0):
+    """同步订阅并把新视频作为一个批次加入队列"""
+    subscriptions = get_subscriptions()
+    try:
+        result = await asyncio.to_thread(subscriptions.sync, subscription_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"同步订阅失败: {str(e)}")
+    if result is None:
+        raise HTTPException(status_code=404, detail="订阅不存在")
+    
+    subscription = subscriptions.get(subscription_id)
+    batch = None
+    try:
+        if result['entries']:
+            output_dir = subscription['output_dir'] or os.path.expanduser("~/Movies/yt-dlp")
+            batch = enqueue_batch(subscription['url'], result['title'], result['entries'],
+                                  subscription['options'], subscription['format'], output_dir, priority)
+    except Exception:
+        subscriptions.release(subscription_id, result)
+        raise
+    # 新视频已加入队列(已持久化)，之后才记录为已见过
+    subscriptions.commit(subscription_id, result)
+    return SyncResponse(
+        subscription_id=subscription_id,
+        new_entries=len(result['entries']),
+        scanned=result['scanned'],
+        elapsed=result['elapsed'],
+        batch=batch
+    )
+
+@app.post("/api/v1/subscriptions", response_model=SyncResponse)
+async def add_subscription(request: SubscriptionRequest):
+    """订阅频道或播放列表并立即进行第一次同步
+
+    第一次同步只记录已有的视频，download_existing 为真时才下载它们。
+    """
+    max_chunk_size = turbo_chunk_size(request)
+    output_dir = request.output_dir or os.path.expanduser("~/Movies/yt-dlp")
+    ydl_opts = build_download_options(request, output_dir, max_chunk_size)
+    subscription = get_subscriptions().add(
+        request.url, ydl_opts, request.format, output_dir, request.download_existing)
+    return await sync_subscription(subscription['id'], request.priority)
+
+@app.get("/api/v1/subscriptions", response_model=List[SubscriptionResponse])
+async def list_subscriptions():
+    return [subscription_response(subscription) for subscription in get_subscriptions().list()]
+
+@app.delete("/api/v1/subscriptions/{subscription_id}")
+async def remove_subscription(subscription_id: str):
+    if not get_subscriptions().remove(subscription_id):
+        raise HTTPException(status_code=404, detail="订阅不存在")
+    return {"message": "订阅已删除"}
+
+@app.post("/api/v1/subscriptions/sync", response_model=List[SyncResponse])
+async def sync_all_subscriptions(priority: int = 0):
+    """并行同步所有订阅，单个订阅同步失败不影响其他订阅"""
+    subscriptions = get_subscriptions().list()
+    results = await asyncio.gather(
+        *(sync_subscription(subscription['id'], priority) for subscription in subscriptions),
+        return_exceptions=True)
+    responses = []
+    for subscription, result in zip(subscriptions, results):
+        if isinstance(result, HTTPException):
+            print(f"同步订阅失败: {subscription['url']}: {result.detail}")
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        responses.append(result)
+    return responses
+
+@app.post("/api/v1/subscriptions/{subscription_id}/sync", response_model=SyncResponse)
+async def sync_one_subscription(subscription_id: str, priority: int = 0):
+    return await sync_subscription(subscription_id, priority)
+
 @app.get("/api/v1/status/{task_id}", response_model=DownloadResponse)
 async def get_status(task_id: str):
-    if task_id not in download_tasks:
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="任务不存在")
         
-    task = download_tasks[task_id]
-    return DownloadResponse(
-        task_id=task_id,
-        status=task['status'],
-        message=task['message'],
-        file_path=task['file_path']
+    return task_response(task)
+
+@app.post("/api/v1/status/batch", response_model=BatchStatusResponse)
+async def get_batch_status(request: BatchStatusRequest):
+    """批量查询任务状态
+
+    传入since时只返回此版本之后有变化的任务，通过version索引只读取变化过的任务；
+    同时传入task_ids时在变化的任务中再按ID过滤。
+    """
+    version = task_store.version
+    wanted = set(request.task_ids) if request.task_ids is not None else None
+    missing = []
+    if wanted:
+        found = task_store.get_many(wanted)
+        missing = [t for t in request.task_ids if t not in found]
+    
+    since = request.since
+    if since is not None and since > version:
+        # 任务数据库被重置后版本号会回退，此时退回按ID全量返回
+        since = None
+    
+    if since is not None:
+        changed = [t for t in task_store.changed_since(since)
+                   if wanted is None or t['id'] in wanted]
+    elif wanted is not None:
+        changed = [found[t] for t in request.task_ids if t in found]
+    else:
+        raise HTTPException(status_code=400, detail="需要提供task_ids或since")
+    
+    tasks = [task_response(task) for task in changed]
+    return BatchStatusResponse(version=version, tasks=tasks, missing=missing)
+
+@app.get("/api/v1/bandwidth", response_model=BandwidthSettings)
+async def get_bandwidth():
+    limit = bandwidth_manager.limit
+    return BandwidthSettings(limit=str(limit) if limit else None)
+
+@app.put("/api/v1/bandwidth", response_model=BandwidthSettings)
+async def set_bandwidth(settings: BandwidthSettings):
+    """调整所有下载共享的总带宽上限，立即对进行中的下载生效"""
+    limit = None
+    if settings.limit:
+        limit = parse_size(settings.limit)
+        if not limit:
+            raise HTTPException(status_code=400, detail="无效的带宽限制")
+    bandwidth_manager.set_limit(limit)
+    if worker_pool:
+        worker_pool.set_bandwidth_limit(limit)
+    return await get_bandwidth()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus格式的运行指标"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/v1/events")
+async def stream_events(task_ids: Optional[str] = None):
+    """以Server-Sent Events推送任务进度、完成和错误事件
+
+    task_ids为逗号分隔的任务ID，不传则推送所有任务的事件。
+    """
+    wanted = set(task_ids.split(',')) if task_ids else None
+    queue = broker.subscribe()
+    
+    async def event_generator():
+        try:
+            while True:
+                try:
+                    event, task_id, data = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # 定期发送注释行保持连接
+                    yield ": keepalive\n\n"
+                    continue
+                if wanted is None or task_id in wanted:
+                    yield format_sse(event, data)
+        finally:
+            broker.unsubscribe(queue)
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
     )
 
 @app.delete("/api/v1/download/{task_id}")
 async def cancel_download(task_id: str):
-    if task_id not in download_tasks:
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="任务不存在")
         
-    task = download_tasks[task_id]
-    if task['thread'] and task['status'] == 'downloading':
-        task['thread'].cancel()
-        task['status'] = 'cancelled'
-        task['message'] = '下载已取消'
+    if task['status'] == 'queued':
+        # 尚未开始的任务直接从队列中丢弃
+        scheduler.discard(task_id)
+        update_task(task_id, status='cancelled', message='下载已取消')
+    elif task_id in active_jobs and task['status'] == 'downloading':
+        if active_jobs[task_id].transferred:
+            # 已进入后处理阶段，ffmpeg完成后任务即结束
+            raise HTTPException(status_code=409, detail="任务正在后处理，无法取消")
+        active_jobs[task_id].cancel()
+        update_task(task_id, status='cancelled', message='下载已取消')
         
     return {"message": "下载已取消"}
 
 async def download_video(task_id: str, url: str, options: dict):
     """异步下载视频"""
-    task = download_tasks[task_id]
-    task['status'] = 'downloading'
-    task['message'] = '正在下载'
-    
-    def progress_callback(progress):
-        if progress['status'] == 'downloading':
-            downloaded = progress.get('downloaded_bytes', 0)
-            total = progress.get('total_bytes', 0) or progress.get('total_bytes_estimate', 0)
-            if total > 0:
-                percent = int(downloaded * 100 / total)
-                task['message'] = f'下载进度: {percent}%'
+    task = task_store.get(task_id)
+    if task is None or task['status'] != 'queued':
+        return
+    update_task(task_id, status='downloading', message='正在下载')
+    last_percent = None
+    
+    def progress_callback(record):
+        nonlocal last_percent
+        percent = record.percent
+        broker.publish('progress', task_id, {
+            'task_id': task_id,
+            'downloaded': record.downloaded,
+            'total': record.total,
+            'percent': percent,
+            'speed': record.speed,
+            'eta': record.eta,
+        })
+        # 百分比未变化时不写入存储，避免轮询方收到无意义的变化
+        if percent is not None and percent != last_percent:
+            last_percent = percent
+            update_task(task_id, message=f'下载进度: {percent}%', progress=percent)
     
     def complete_callback(info):
-        # 移除调试打印
-        task['status'] = 'completed'
-        task['message'] = '下载完成'
-        
         # 详细记录下载信息
+        file_path = None
         if info and 'requested_downloads' in info and info['requested_downloads']:
             download_info = info['requested_downloads'][0]
-            task['file_path'] = download_info.get('filepath')
-            print(f"下载完成: {task['file_path']}")
+            file_path = download_info.get('filepath')
+            print(f"下载完成: {file_path}")
         else:
             print("下载完成，但无法获取文件路径信息")
             print(f"Info对象内容: {info}")
+        
+        update_task(task_id, status='completed', message='下载完成', file_path=file_path, progress=100)
     
     def error_callback(error):
-        task['status'] = 'error'
-        task['message'] = f'下载失败: {error}'
+        update_task(task_id, status='error', message=f'下载失败: {error}')
         print(f"下载错误: {error}")
     
-    # 创建下载线程
-    thread = DownloadThread(url, options)
+    def cancelled_callback():
+        if task_store.get(task_id)['status'] != 'cancelled':
+            update_task(task_id, status='cancelled', message='下载已取消')
     
-    # 确保信号连接正确
-    thread.progress_signal.connect(progress_callback)
-    thread.complete_signal.connect(complete_callback)
-    thread.error_signal.connect(error_callback)
-    
-    task['thread'] = thread
-    thread.start()
-    
-    # 等待下载完成，移除调试打印，增加状态检查
-    while thread.isRunning():
-        # 每秒检查一次状态
-        await asyncio.sleep(1)
-        print(f"任务 {task_id} 状态: {task['status']}, 消息: {task['message']}")
-    
-    # 线程结束后再次检查状态
-    print(f"线程已结束，最终状态: {task['status']}")
+    # 创建下载任务，回调直接在下载线程(或进程池的事件线程)中执行
+    callbacks = dict(
+        on_progress=progress_callback,
+        on_complete=complete_callback,
+        on_error=error_callback,
+        on_cancelled=cancelled_callback
+    )
+    # 记录到下载日志，服务异常退出后可以断点续传
+    options = dict(options, job_id=task_id, journal='api', postprocess_pool=postprocess_workers)
+    if worker_pool:
+        job = worker_pool.submit(task_id, url, options, **callbacks)
+    else:
+        job = DownloadJob(url, options, **callbacks)
+        job.start()
+    active_jobs[task_id] = job
+    job.add_done_callback(lambda: active_jobs.pop(task_id, None))
     
-    # 如果线程结束但状态仍为downloading，可能是信号没有正确触发
-    if task['status'] == 'downloading':
-        print("警告: 线程已结束但状态未更新，手动设置为completed")
-        task['status'] = 'completed'
-        task['message'] = '下载可能已完成(自动检测)'
+    # 网络传输结束即释放下载槽位，合并、转码等后处理在后处理进程池中继续
+    await job.wait_transfer_async()
+    if not job.wait(0):
+        update_task(task_id, message='正在后处理')
+
+def start_api_server(host="127.0.0.1", port=8765, max_workers=None, progress_interval=0.5,
+                     retention_days=7, bandwidth_limit=None, processes=0,
+                     postprocess_processes=DEFAULT_PROCESSES):
+    """启动API服务器
 
-def start_api_server(host="127.0.0.1", port=8765):
-    """启动API服务器"""
+    processes大于0时启用多进程模式，下载在独立的worker进程中执行，
+    同时下载的任务数等于进程数，不能再指定max_workers。postprocess_processes为后处理进程数，
+    多进程模式下每个worker进程各自使用这么多后处理进程。
+    """
+    global worker_pool, postprocess_workers
+    postprocess_workers = postprocess_processes
+    bandwidth_manager.set_limit(parse_size(bandwidth_limit))
+    if processes > 0 and max_workers is not None and max_workers != processes:
+        raise ValueError("多进程模式下同时下载的任务数等于进程数，不能同时指定 max_workers")
+    scheduler.max_workers = max_workers or 3
+    if processes > 0:
+        worker_pool = ProcessWorkerPool(processes)
+        worker_pool.bandwidth_limit = bandwidth_manager.limit
+        scheduler.max_workers = processes
+    broker.progress_interval = progress_interval
+    task_store.retention_days = retention_days
     uvicorn.run(app, host=host, port=port)
 
 if __name__ == "__main__":
-    start_api_server()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="YouTube Downloader API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="同时下载的最大任务数，默认3")
+    parser.add_argument("--progress-interval", type=float, default=0.5, help="同一任务进度推送的最小间隔(秒)")
+    parser.add_argument("--retention-days", type=int, default=7, help="已结束任务的保留天数")
+    parser.add_argument("--bandwidth-limit", default=None, help="所有下载共享的总带宽上限，如 10M")
+    parser.add_argument("--processes", type=int, default=0, help="worker进程数，大于0时启用多进程下载")
+    parser.add_argument("--postprocess-workers", type=int, default=DEFAULT_PROCESSES,
+                        help="后处理(合并、转码)进程数，0表示在下载线程中执行")
+    args = parser.parse_args()
+    if args.processes > 0 and args.workers is not None and args.workers != args.processes:
+        parser.error("--workers 不能与 --processes 同时使用：多进程模式下同时下载的任务数等于进程数")
+    start_api_server(args.host, args.port, args.workers, args.progress_interval,
+                     args.retention_days, args.bandwidth_limit, args.processes,
+                     args.postprocess_workers)
\ No newline at end of file
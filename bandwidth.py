@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import itertools
+import threading
+import time
+
+# 最近多长时间内有数据的下载视为活跃(秒)，空闲的下载不占用带宽份额
+ACTIVE_WINDOW = 1.0
+# 令牌桶容量，以秒计的突发流量
+BURST_SECONDS = 0.5
+# 单次最长等待时间，避免限速调整后长时间阻塞
+MAX_SLEEP = 2.0
+
+
+class _Flow:
+    def __init__(self, weight):
+        self.weight = weight
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.last_active = 0.0
+
+
+class BandwidthManager:
+    """进程级带宽管理器
+
+    所有下载共享一个总带宽预算，按权重在当前活跃的下载之间公平分配，
+    每个下载使用各自的令牌桶。预算可以在运行时调整，为None表示不限速。
+    """
+
+    def __init__(self, limit=None):
+        """
+        Args:
+            limit: 总带宽上限(字节/秒)，None或0表示不限速
+        """
+        self.limit = limit or None
+        self._flows = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def set_limit(self, limit):
+        """运行时调整总带宽上限"""
+        with self._lock:
+            self.limit = limit or None
+            for flow in self._flows.values():
+                flow.tokens = 0.0
+
+    def register(self, weight=1.0):
+        """登记一个下载，返回用于 consume() 的句柄"""
+        with self._lock:
+            handle = next(self._ids)
+            self._flows[handle] = _Flow(max(weight, 0.01))
+        return handle
+
+    def unregister(self, handle):
+        with self._lock:
+            self._flows.pop(handle, None)
+
+    def consume(self, handle, nbytes):
+        """记录下载的字节数，超出份额时阻塞当前线程"""
+        with self._lock:
+            flow = self._flows.get(handle)
+            if not self.limit or flow is None or nbytes <= 0:
+                return
+
+            now = time.monotonic()
+            flow.last_active = now
+            active_weight = sum(
+                f.weight for f in self._flows.values()
+                if now - f.last_active < ACTIVE_WINDOW
+            )
+            rate = self.limit * flow.weight / active_weight
+
+            flow.tokens = min(rate * BURST_SECONDS, flow.tokens + (now - flow.updated) * rate)
+            flow.updated = now
+            flow.tokens -= nbytes
+            delay = -flow.tokens / rate if flow.tokens < 0 else 0
+
+        if delay:
+            time.sleep(min(delay, MAX_SLEEP))
+
+
+# 进程内所有下载共享的带宽管理器
+bandwidth_manager = BandwidthManager()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+
+from download import YouTubeDownloader
+from info_cache import info_cache
+
+# 从下载选项中沿用到列表展开和信息提取的选项
+_EXTRACT_OPTION_KEYS = ('proxy', 'cookiesfrombrowser', 'cookiefile')
+# 频道页展开后得到的是各个标签页(视频、Shorts、直播)的播放列表，最多再展开这么多层
+MAX_NESTING = 2
+# 批量下载时提前预取信息的条目数，只预取即将下载的少量条目
+PREFETCH_AHEAD = 4
+
+
+def extract_options(options=None):
+    """信息提取使用的选项：只沿用代理和cookies，不需要日志和下载相关的设置"""
+    options = options or {}
+    extract_opts = {key: options[key] for key in _EXTRACT_OPTION_KEYS if key in options}
+    extract_opts.update(quiet=True, no_warnings=True)
+    return extract_opts
+
+
+def playlist_entry_url(entry):
+    """平铺提取的条目对应的视频URL"""
+    url = entry.get('url') or entry.get('webpage_url')
+    if url and '://' not in url and entry.get('ie_key') == 'Youtube':
+        url = f"https://www.youtube.com/watch?v={url}"
+    return url
+
+
+def expand_playlist(url, options=None):
+    """平铺展开播放列表或频道，只获取条目的URL和标题，不提取每个视频的详细信息
+
+    Returns:
+        {'title': 列表标题, 'entries': [{'url', 'id', 'title'}]}；URL是单个视频时返回None
+    """
+    flat_opts = dict(extract_options(options), extract_flat='in_playlist')
+    with yt_dlp.YoutubeDL(flat_opts) as ydl:
+        result = ydl.extract_info(url, download=False)
+        if result.get('_type', 'video') != 'playlist':
+            return None
+
+        entries = []
+
+        def collect(playlist, depth):
+            for entry in playlist.get('entries') or []:
+                if not entry:
+                    continue
+                entry_url = playlist_entry_url(entry)
+                # 频道的标签页本身也是播放列表
+                if entry.get('_type') == 'playlist' or (
+                        entry.get('ie_key') == 'YoutubeTab' and depth < MAX_NESTING):
+                    nested = entry if entry.get('_type') == 'playlist' else \
+                        ydl.extract_info(entry_url, download=False)
+                    collect(nested, depth + 1)
+                elif entry_url:
+                    entries.append({
+                        'url': entry_url,
+                        'id': entry.get('id'),
+                        'title': entry.get('title') or entry_url,
+                    })
+
+        collect(result, 0)
+
+    # 同一视频在不同标签页中可能重复出现
+    seen = set()
+    unique = []
+    for entry in entries:
+        if entry['url'] not in seen:
+            seen.add(entry['url'])
+            unique.append(entry)
+    return {'title': result.get('title') or url, 'entries': unique}
+
+
+class InfoPrefetcher:
+    """并行预取视频信息
+
+    在后台线程池中提前提取即将下载的条目的详细信息并放入 info_cache，
+    下载开始时直接复用，列表中的视频不再逐个串行提取。
+    只预取即将下载的少量条目，避免缓存的下载地址在轮到下载前过期。
+    """
+
+    def __init__(self, workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def prefetch(self, urls, options=None):
+        """提交预取，已缓存或正在预取的URL会被跳过"""
+        extract_opts = extract_options(options)
+        for url in urls:
+            with self._lock:
+                if url in self._pending or info_cache.contains(url):
+                    continue
+                self._pending.add(url)
+            self._executor.submit(self._fetch, url, extract_opts)
+
+    def _fetch(self, url, extract_opts):
+        try:
+            YouTubeDownloader.extract_info(url, extract_opts, download=False)
+        except Exception as e:
+            # 预取失败不影响下载，下载时会重新提取并报告错误
+            print(f"预取视频信息失败: {url}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.discard(url)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 进程内共享的预取器
+info_prefetcher = InfoPrefetcher()
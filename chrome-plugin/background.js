@@ -14,6 +14,20 @@ chrome.runtime.onInstalled.addListener(() => {
     contexts: ["link", "video", "page"]
   });
   
+  chrome.contextMenus.create({
+    id: "downloadM4A",
+    parentId: "downloadVideo",
+    title: "仅音频 (M4A)",
+    contexts: ["link", "video", "page"]
+  });
+  
+  chrome.contextMenus.create({
+    id: "downloadOpus",
+    parentId: "downloadVideo",
+    title: "仅音频 (Opus)",
+    contexts: ["link", "video", "page"]
+  });
+  
   chrome.contextMenus.create({
     id: "downloadMP3",
     parentId: "downloadVideo",
@@ -46,6 +60,12 @@ chrome.contextMenus.onClicked.addListener((info, tab) => {
     case "downloadBestQuality":
       format = "最佳质量";
       break;
+    case "downloadM4A":
+      format = "仅音频 (M4A)";
+      break;
+    case "downloadOpus":
+      format = "仅音频 (Opus)";
+      break;
     case "downloadMP3":
       format = "仅音频 (MP3)";
       break;
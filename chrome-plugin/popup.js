@@ -119,10 +119,58 @@ document.addEventListener('DOMContentLoaded', function() {
   // 加载任务列表
   loadTasks();
   
-  // 定期刷新任务状态
-  setInterval(refreshTasksStatus, 5000);
+  // 订阅服务端推送的任务事件，连接失败时退回定期轮询
+  subscribeTaskEvents();
 });
 
+// 订阅任务事件流
+function subscribeTaskEvents() {
+  chrome.storage.sync.get({apiUrl: 'http://localhost:8765/api/v1/download'}, function(items) {
+    const baseApiUrl = items.apiUrl.replace('/download', '');
+    const source = new EventSource(`${baseApiUrl}/events`);
+    
+    // 连接建立后先同步一次当前状态
+    source.addEventListener('open', refreshTasksStatus);
+    
+    source.addEventListener('progress', function(event) {
+      const data = JSON.parse(event.data);
+      if (data.percent !== null) {
+        updateStoredTask(data.task_id, {message: `下载进度: ${data.percent}%`});
+      }
+    });
+    
+    ['queued', 'downloading', 'completed', 'error', 'cancelled', 'skipped'].forEach(function(status) {
+      source.addEventListener(status, function(event) {
+        const data = JSON.parse(event.data);
+        updateStoredTask(data.task_id, {
+          status: data.status,
+          message: data.message,
+          file_path: data.file_path
+        });
+      });
+    });
+    
+    source.onerror = function() {
+      source.close();
+      console.error('任务事件流连接失败，改为定期轮询');
+      setInterval(refreshTasksStatus, 5000);
+    };
+  });
+}
+
+// 更新已存储的单个任务
+function updateStoredTask(taskId, fields) {
+  chrome.storage.local.get({tasks: []}, function(result) {
+    if (!result.tasks.some(t => t.id === taskId)) {
+      return;
+    }
+    const updatedTasks = result.tasks.map(t => t.id === taskId ? {...t, ...fields} : t);
+    chrome.storage.local.set({tasks: updatedTasks}, function() {
+      loadTasks();
+    });
+  });
+}
+
 // 加载任务列表
 function loadTasks() {
   chrome.storage.local.get({tasks: []}, function(result) {
@@ -153,6 +201,7 @@ function loadTasks() {
         <div>格式: ${task.format}</div>
         <div>时间: ${time}</div>
         <div>状态: <span class="${statusClass}">${getStatusText(task.status)}</span></div>
+        ${task.status === 'downloading' && task.message ? `<div>${task.message}</div>` : ''}
       `;
       
       tasksContainer.appendChild(taskElement);
@@ -162,12 +211,13 @@ function loadTasks() {
 
 // 刷新任务状态
 function refreshTasksStatus() {
-  chrome.storage.local.get({tasks: []}, function(result) {
+  chrome.storage.local.get({tasks: [], statusVersion: 0}, function(result) {
     const tasks = result.tasks;
     
     // 只更新非完成状态的任务
     const pendingTasks = tasks.filter(task => 
-      task.status !== 'completed' && task.status !== 'error' && task.status !== 'cancelled'
+      task.status !== 'completed' && task.status !== 'error' && task.status !== 'cancelled' &&
+      task.status !== 'skipped'
     );
     
     if (pendingTasks.length === 0) {
@@ -178,39 +228,58 @@ function refreshTasksStatus() {
     chrome.storage.sync.get({apiUrl: 'http://localhost:8765/api/v1/download'}, function(items) {
       const baseApiUrl = items.apiUrl.replace('/download', '');
       
-      // 为每个待处理任务获取最新状态
-      pendingTasks.forEach(function(task) {
-        fetch(`${baseApiUrl}/status/${task.id}`)
-          .then(response => {
-            if (!response.ok) {
-              throw new Error(`HTTP error! Status: ${response.status}`);
+      // 一次请求获取所有待处理任务自上次轮询以来的变化
+      fetch(`${baseApiUrl}/status/batch`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+          task_ids: pendingTasks.map(task => task.id),
+          since: result.statusVersion
+        })
+      })
+        .then(response => {
+          if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+          }
+          return response.json();
+        })
+        .then(data => {
+          const changed = {};
+          data.tasks.forEach(function(item) {
+            changed[item.task_id] = item;
+          });
+          
+          // 更新任务状态，服务端已不存在的任务标记为失败
+          const updatedTasks = tasks.map(t => {
+            if (changed[t.id]) {
+              return {
+                ...t,
+                status: changed[t.id].status,
+                message: changed[t.id].message,
+                file_path: changed[t.id].file_path
+              };
             }
-            return response.json();
-          })
-          .then(data => {
-            // 更新任务状态
-            const updatedTasks = result.tasks.map(t => {
-              if (t.id === task.id) {
-                return {
-                  ...t,
-                  status: data.status,
-                  message: data.message,
-                  file_path: data.file_path
-                };
-              }
-              return t;
-            });
-            
-            // 保存更新后的任务列表
-            chrome.storage.local.set({tasks: updatedTasks}, function() {
-              // 刷新UI
-              loadTasks();
-            });
-          })
-          .catch(error => {
-            console.error(`获取任务 ${task.id} 状态失败:`, error);
+            if (data.missing.includes(t.id)) {
+              return {
+                ...t,
+                status: 'error',
+                message: '任务不存在'
+              };
+            }
+            return t;
           });
-      });
+          
+          // 保存更新后的任务列表和版本号
+          chrome.storage.local.set({tasks: updatedTasks, statusVersion: data.version}, function() {
+            // 刷新UI
+            loadTasks();
+          });
+        })
+        .catch(error => {
+          console.error('批量获取任务状态失败:', error);
+        });
     });
   });
 }
@@ -235,6 +304,8 @@ function getStatusText(status) {
   switch (status) {
     case 'pending':
       return '等待下载';
+    case 'queued':
+      return '排队中';
     case 'downloading':
       return '正在下载';
     case 'completed':
@@ -243,6 +314,8 @@ function getStatusText(status) {
       return '下载失败';
     case 'cancelled':
       return '已取消';
+    case 'skipped':
+      return '已下载过';
     default:
       return status;
   }
@@ -4,8 +4,9 @@
 import yt_dlp
 from utils import format_size, format_time, format_duration
 import os
-from datetime import datetime
-from my_logger import MyLogger
+from my_logger import MyLogger, is_verbose, task_log_path
+from info_cache import info_cache
+
 class YouTubeDownloader:
     """YouTube视频下载器核心类"""
     
@@ -23,8 +24,15 @@ class YouTubeDownloader:
             视频信息字典
         """
         try:
+            # 只分析时优先使用缓存，避免重复提取
+            if not download:
+                cached = info_cache.get(url)
+                if cached is not None:
+                    return cached
             with yt_dlp.YoutubeDL(options or {}) as ydl:
                 info = ydl.extract_info(url, download=download)
+                if not download:
+                    info_cache.put(url, info)
                 return info
         except Exception as e:
             raise Exception(f"处理视频时出错: {str(e)}")
@@ -77,13 +85,15 @@ class YouTubeDownloader:
         }
     
     @staticmethod
-    def configure_logging(download_path, url=None):
+    def configure_logging(download_path, url=None, task_id=None, verbose=None):
         """
         配置yt-dlp的日志选项
         
         Args:
             download_path: 下载目录路径
             url: 视频URL (可选)
+            task_id: 任务ID (可选)，记录在任务日志索引中，默认使用日志文件名
+            verbose: 是否输出yt-dlp的详细调试信息，默认按当前日志级别决定
             
         Returns:
             包含日志配置的选项字典
@@ -93,18 +103,20 @@ class YouTubeDownloader:
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
         
-        # 使用时间戳创建唯一的日志文件名
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        video_id = url.split('?v=')[-1].split('&')[0] if url and '?v=' in url else 'video'
-        log_file = os.path.join(log_dir, f'yt-dlp_{video_id}_{timestamp}.log')
-        custom_logger = MyLogger.get_instance(log_file)
+        # 使用时间戳创建唯一的日志文件名，每个任务写入自己的日志文件
+        log_file = task_log_path(log_dir, url)
+        custom_logger = MyLogger.for_task(log_file, task_id, url)
+        if verbose is None:
+            verbose = is_verbose()
         # 配置日志选项
         log_opts = {
             # 移除错误的YoutubeDLLogger引用
             'logger': custom_logger,
             'logtostderr': False,  # 不将日志输出到stderr
             'quiet': False,        # 不使用安静模式
-            'verbose': True,       # 使用详细模式
+            'verbose': verbose,    # 详细模式
+            # 进度由进度回调显示，文本进度行只在详细模式下写入日志
+            'noprogress': not verbose,
             'writedescription': True,  # 写入视频描述
             'writeinfojson': False,     # 写入视频信息JSON
             'logfile': log_file
@@ -138,6 +150,21 @@ class YouTubeDownloader:
                 'preferredcodec': 'mp3',
                 'preferredquality': '192',
             }]
+        elif format_option == "仅音频 (M4A)":
+            # 优先选择m4a/AAC音频流，直接保存无需处理；其他AAC来源只换容器(流复制)，
+            # 只有源音频不是AAC时才转码
+            ydl_opts['format'] = 'bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]/bestaudio/best'
+            ydl_opts['postprocessors'] = [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'm4a',
+            }]
+        elif format_option == "仅音频 (Opus)":
+            # 优先选择Opus音频流，从webm中流复制到.opus文件，只有源音频不是Opus时才转码
+            ydl_opts['format'] = 'bestaudio[acodec=opus]/bestaudio/best'
+            ydl_opts['postprocessors'] = [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'opus',
+            }]
         elif format_option == "仅字幕":
             # 跳过视频下载，只下载字幕
             ydl_opts['skip_download'] = True
@@ -155,10 +182,9 @@ class YouTubeDownloader:
             if 'postprocessors' not in ydl_opts:
                 ydl_opts['postprocessors'] = []
             
-            # 使用更明确的后处理器配置
+            # 使用纯Python的VTT转SRT后处理器，不为每个字幕文件启动ffmpeg进程
             ydl_opts['postprocessors'].append({
-                'key': 'FFmpegSubtitlesConvertor',
-                'format': 'srt',
+                'key': 'VttToSrt',
                 'when': 'before_dl',  # 在下载前运行后处理器
             })
             
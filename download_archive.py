@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+import yt_dlp
+from yt_dlp.utils import make_archive_id
+
+
+@lru_cache(maxsize=1)
+def _extractor_classes():
+    # 与YoutubeDL匹配URL时的顺序相同，通用提取器排在最后
+    return [ie for ie in yt_dlp.extractor.gen_extractor_classes() if ie.ie_key() != 'Generic']
+
+
+@lru_cache(maxsize=4096)
+def archive_id(url):
+    """不联网，仅根据URL得到 '提取器 视频ID' 形式的存档ID，无法确定时返回None
+
+    与yt-dlp的 download_archive 使用相同的格式和匹配方式。
+    """
+    for ie in _extractor_classes():
+        if not ie.suitable(url):
+            continue
+        try:
+            video_id = ie.get_temp_id(url)
+        except Exception:
+            video_id = None
+        return make_archive_id(ie, video_id) if video_id else None
+    return None
+
+
+def info_archive_id(info):
+    """下载结果对应的存档ID"""
+    if not info or not info.get('id') or not info.get('extractor_key'):
+        return None
+    return make_archive_id(info['extractor_key'], info['id'])
+
+
+class DownloadArchive:
+    """已下载视频的存档索引
+
+    以 (提取器, 视频ID, 格式配置) 为键记录下载过的视频，启动时载入内存集合，
+    下载前不需要任何网络请求即可判断是否已下载过，批量重复下载时直接跳过。
+    """
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.expanduser("~/youtube_downloader_archive.db")
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS archive (
+                    archive_id TEXT NOT NULL,
+                    profile TEXT NOT NULL,
+                    title TEXT,
+                    file_path TEXT,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (archive_id, profile)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._keys = set(self._conn.execute("SELECT archive_id, profile FROM archive"))
+
+    def contains(self, url, profile):
+        """URL对应的视频是否已以该格式配置下载过"""
+        video_archive_id = archive_id(url)
+        if video_archive_id is None:
+            return False
+        key = (video_archive_id, profile or '')
+        if key in self._keys:
+            return True
+        # 其他进程(下载工作进程)记录的视频不在本进程的集合中，按主键再查一次
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM archive WHERE archive_id = ? AND profile = ?", key).fetchone()
+            if row:
+                self._keys.add(key)
+        return row is not None
+
+    def add(self, video_archive_ids, profile, title=None, file_path=None):
+        """记录一个视频，video_archive_ids 可以是一个存档ID或同一视频的多个存档ID"""
+        if isinstance(video_archive_ids, str):
+            video_archive_ids = [video_archive_ids]
+        keys = [(video_archive_id, profile or '') for video_archive_id in video_archive_ids]
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO archive (archive_id, profile, title, file_path, created_at) "
+                "VALUES (?, ?, ?, ?, ?)", [(*key, title, file_path, now) for key in keys])
+            self._keys.update(keys)
+
+    def add_info(self, info, profile, url=None):
+        """记录下载完成的视频
+
+        下载前按URL得到的临时ID查找，它与提取后的视频ID不一定相同
+        (如Bilibili的URL中是BV号，提取结果中是av号)，所以同时记录两者以及旧版本的存档ID。
+        """
+        video_archive_ids = {info_archive_id(info), *(info.get('_old_archive_ids') or [])}
+        if url:
+            video_archive_ids.add(archive_id(url))
+        video_archive_ids.discard(None)
+        if not video_archive_ids:
+            return
+        downloads = info.get('requested_downloads') or [{}]
+        self.add(sorted(video_archive_ids), profile, info.get('title'), downloads[0].get('filepath'))
+
+    def remove(self, url, profile):
+        """删除存档记录，之后可以重新下载"""
+        key = (archive_id(url), profile or '')
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM archive WHERE archive_id = ? AND profile = ?", key)
+            self._keys.discard(key)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def needs_backfill(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'history_backfilled'").fetchone()
+        return row is None
+
+    def backfill(self, history_list):
+        """第一次使用时从已有的下载历史导入，返回导入的条数"""
+        if not self.needs_backfill():
+            return 0
+        now = time.time()
+        rows = []
+        for item in history_list:
+            video_archive_id = archive_id(item.get('url') or '')
+            if video_archive_id:
+                rows.append((video_archive_id, item.get('format') or '', item.get('title'),
+                             item.get('filepath'), now))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO archive (archive_id, profile, title, file_path, created_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('history_backfilled', ?)", (str(now),))
+            self._keys.update((row[0], row[1]) for row in rows)
+        return len(rows)
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """获取进程内共享的下载存档，首次使用时才打开数据库"""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = DownloadArchive()
+        return _archive
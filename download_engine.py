@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import yt_dlp
+
+import metrics
+from bandwidth import bandwidth_manager
+from download_archive import get_archive
+from download_journal import get_journal
+from info_cache import info_cache
+from postprocess_pool import postprocess_pool
+from postprocessors import create_youtube_dl
+from progress import ProgressAggregator
+from turbo import DEFAULT_MAX_CHUNK_SIZE, DEFAULT_MAX_FRAGMENTS, turbo_tuner
+from utils import normalize_video_key, serializable_options
+
+# 不属于yt-dlp的任务级选项，随下载选项一起传递和持久化，创建YoutubeDL前取出
+ENGINE_OPTIONS = {
+    'bandwidth_weight': 1.0,  # 全局带宽预算中的分配权重
+    'job_id': None,           # 下载日志中的任务ID
+    'journal': None,          # 下载日志来源('api'/'gui')，为None时不记录日志
+    'progress_rate': 10.0,    # 每秒最多报告进度的次数，0表示每次回调都报告
+    'parallel_streams': True, # 合并格式的视频流和音频流同时下载
+    'turbo': False,           # 加速模式：并行下载分片，根据吞吐量自动调节并发数和分块大小
+    'turbo_max_fragments': DEFAULT_MAX_FRAGMENTS,    # 加速模式的最大并发分片数
+    'turbo_max_chunk_size': DEFAULT_MAX_CHUNK_SIZE,  # 加速模式的最大HTTP分块大小(字节)
+    'postprocess_pool': 0,    # 后处理进程数，大于0时后处理交给独立的进程池，下载线程在传输结束后即返回
+    'archive_profile': None,  # 格式配置名称，完成后以此记录到下载存档；为None时不记录
+}
+
+# 下载日志中已下载字节数的更新间隔(秒)
+JOURNAL_INTERVAL = 5.0
+
+# 进行中下载的当前速度，供指标汇总
+_active_speeds = {}
+_speeds_lock = threading.Lock()
+
+
+def _total_speed():
+    with _speeds_lock:
+        return sum(_active_speeds.values())
+
+
+def set_speed(key, speed):
+    """记录一个进行中下载的当前速度，speed为None时移除；worker进程中的下载由worker池代为记录"""
+    with _speeds_lock:
+        if speed is None:
+            _active_speeds.pop(key, None)
+        else:
+            _active_speeds[key] = speed
+
+
+metrics.download_speed_bytes.set_function(_total_speed)
+
+
+# 只影响日志、进度和调度而不影响下载结果的选项，不参与任务键
+KEY_IGNORED_OPTIONS = {'logger', 'logfile', 'logtostderr', 'quiet', 'verbose', 'noprogress',
+                       'ratelimit', 'progress_hooks', 'postprocessor_hooks', *ENGINE_OPTIONS}
+
+
+def job_key(url, format_option, output_dir, options=None):
+    """下载内容的唯一标识：同一视频、同一格式、同一输出目录并且影响输出的下载选项
+    (字幕、代理、后处理等)都相同时，视为相同的下载"""
+    output_dir = os.path.normcase(os.path.abspath(os.path.expanduser(output_dir)))
+    relevant = {key: value for key, value in serializable_options(options or {}).items()
+                if key not in KEY_IGNORED_OPTIONS}
+    digest = hashlib.sha1(json.dumps(relevant, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return f"{normalize_video_key(url)}|{format_option}|{output_dir}|{digest}"
+
+
+class _BeforeDownloadPP(yt_dlp.postprocessor.PostProcessor):
+    """格式已选定、文件开始下载前调用任务的 _before_download()"""
+
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def run(self, info):
+        self.job._before_download(info)
+        return [], info
+
+
+class JobHandle:
+    """下载任务的回调和结束等待约定
+
+    每个任务结束时 on_complete / on_error / on_cancelled 三者之一恰好被调用一次。
+    网络传输结束(后处理可能仍在进行)和任务结束分别可以等待，前者不晚于后者。
+    """
+
+    def __init__(self, on_progress=None, on_complete=None, on_error=None, on_cancelled=None):
+        self.on_progress = on_progress
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.on_cancelled = on_cancelled
+        self.is_cancelled = False
+        self._done = threading.Event()
+        self._done_callbacks = []
+        self._transferred = threading.Event()
+        self._transfer_callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """请求取消下载"""
+        self.is_cancelled = True
+
+    @property
+    def transferred(self):
+        """网络传输是否已经结束"""
+        return self._transferred.is_set()
+
+    def wait(self, timeout=None):
+        """阻塞等待任务结束"""
+        return self._done.wait(timeout)
+
+    async def wait_async(self):
+        """在事件循环中等待任务结束，不占用额外线程"""
+        await self._wait_callback_async(self.add_done_callback)
+
+    async def wait_transfer_async(self):
+        """在事件循环中等待网络传输结束"""
+        await self._wait_callback_async(self.add_transfer_callback)
+
+    @staticmethod
+    async def _wait_callback_async(register):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve():
+            if not future.done():
+                future.set_result(None)
+
+        register(lambda: loop.call_soon_threadsafe(resolve))
+        await future
+
+    def add_done_callback(self, callback):
+        """注册任务结束后的回调，任务已结束时立即调用"""
+        with self._lock:
+            if not self._done.is_set():
+                self._done_callbacks.append(callback)
+                return
+        callback()
+
+    def add_transfer_callback(self, callback):
+        """注册网络传输结束后的回调，已结束时立即调用"""
+        with self._lock:
+            if not self._transferred.is_set():
+                self._transfer_callbacks.append(callback)
+                return
+        callback()
+
+    def _emit(self, callback, *args):
+        if callback:
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"下载回调出错: {str(e)}")
+
+    def _transfer_done(self):
+        with self._lock:
+            if self._transferred.is_set():
+                return
+            self._transferred.set()
+            callbacks, self._transfer_callbacks = self._transfer_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def _finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._done_callbacks = self._done_callbacks, []
+        # 先标记结束再通知传输结束，等待传输的一方据此区分是否还有后处理
+        self._transfer_done()
+        for callback in callbacks:
+            callback()
+
+
+class DownloadJob(JobHandle):
+    """不依赖Qt的下载任务
+
+    在独立线程中运行yt-dlp，通过回调报告进度、完成、错误和取消，回调在下载线程中执行。
+    """
+
+    def __init__(self, url, options, on_progress=None, on_complete=None,
+                 on_error=None, on_cancelled=None):
+        super().__init__(on_progress, on_complete, on_error, on_cancelled)
+        self.url = url
+        self.options = dict(options)
+        self.settings = {key: self.options.pop(key, default)
+                         for key, default in ENGINE_OPTIONS.items()}
+        self.ydl = None
+        self._thread = None
+        self._bandwidth_handle = None
+        self._last_bytes = {}
+        # 本次运行实际传输的字节数，不包括续传前已在磁盘上的部分
+        self.bytes_transferred = 0
+        # 当前下载速度和尚未取走的阶段耗时，多进程模式下随事件回传给API进程汇总指标
+        self.speed = 0
+        self._timings = []
+        self._postprocess_started = {}
+        self._postprocess_time = 0.0
+        self._journal = None
+        self._journal_saved = 0.0
+        self._turbo_level = None
+        self._turbo_host = None
+        self._deferred = []
+        self._parallel_streams = {}
+        self._stream_results = {}
+        # on_progress 收到采样后的 ProgressRecord，而不是yt-dlp的完整进度字典
+        self._progress = ProgressAggregator(self._report_progress, self.settings['progress_rate'])
+
+    def start(self):
+        """在新线程中启动下载"""
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        """在当前线程中执行下载
+
+        启用后处理进程池时，网络传输结束后即返回，任务在后处理完成后才结束。
+        """
+        deferred = False
+        try:
+            self.options['progress_hooks'] = [self.progress_hook]
+            self.options['postprocessor_hooks'] = [self.postprocessor_hook]
+
+            if self.is_cancelled:
+                self._emit(self.on_cancelled)
+                return
+
+            self._bandwidth_handle = bandwidth_manager.register(self.settings['bandwidth_weight'])
+            self._open_journal()
+            self.ydl = create_youtube_dl(self.options)
+            self.ydl.add_post_processor(_BeforeDownloadPP(self), when='before_dl')
+            self.ydl.dl = self._dl
+            if self.settings['postprocess_pool']:
+                self.ydl.post_process = self._defer_post_process
+            info = self._download()
+
+            if self._deferred and not self.is_cancelled:
+                self._submit_postprocess(info)
+                deferred = True
+            else:
+                self._succeed(info)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            bandwidth_manager.unregister(self._bandwidth_handle)
+            self.speed = 0
+            set_speed(id(self), None)
+            if deferred:
+                self._transfer_done()
+            else:
+                self._end()
+
+    def _succeed(self, info):
+        if self.is_cancelled:
+            metrics.downloads_total.inc(status='cancelled')
+            self._emit(self.on_cancelled)
+        else:
+            self._complete(info)
+
+    def _complete(self, info):
+        metrics.downloads_total.inc(status='completed')
+        if self.settings['archive_profile'] is not None:
+            try:
+                get_archive().add_info(info, self.settings['archive_profile'], self.url)
+            except Exception as e:
+                print(f"记录下载存档失败: {str(e)}")
+        self._emit(self.on_complete, info)
+
+    def _fail(self, error):
+        if self.is_cancelled:
+            metrics.downloads_total.inc(status='cancelled')
+            self._emit(self.on_cancelled)
+        else:
+            metrics.downloads_total.inc(status='error')
+            metrics.download_errors_total.inc(cause=metrics.classify_error(error))
+            self._emit(self.on_error, str(error))
+
+    def _end(self):
+        # 正常结束(包括失败和取消)的任务不再需要恢复；进程崩溃时记录会保留下来
+        self.remove_journal()
+        self._finish()
+
+    def _defer_post_process(self, filename, info, files_to_move=None):
+        """替代 YoutubeDL.post_process：记录需要的后处理，下载结束后交给进程池执行"""
+        pps = [type(pp).__name__ for pp in info.get('__postprocessors') or []]
+        if not pps and not self.ydl._pps['post_process'] and not self.ydl._pps['after_move']:
+            return yt_dlp.YoutubeDL.post_process(self.ydl, filename, info, files_to_move)
+        payload = yt_dlp.YoutubeDL.sanitize_info(dict(info, __postprocessors=pps))
+        self._deferred.append((filename, payload, dict(files_to_move or {})))
+        return info
+
+    def _submit_postprocess(self, info):
+        """把后处理提交到进程池，完成后再报告任务结果"""
+        postprocess_pool.set_processes(self.settings['postprocess_pool'])
+        future = postprocess_pool.submit(serializable_options(self.options), self._deferred)
+
+        def done(future):
+            try:
+                filepaths, timings = future.result()
+                for name, elapsed in timings:
+                    self._observe(metrics.postprocess_seconds, elapsed, postprocessor=name)
+                # 下载结果中的文件路径更新为后处理后的路径
+                for download, filepath in zip(info.get('requested_downloads') or [], filepaths):
+                    if filepath:
+                        download['filepath'] = filepath
+                # 后处理已开始，取消不再生效
+                self._complete(info)
+            except Exception as e:
+                self._fail(e)
+            finally:
+                self._end()
+
+        future.add_done_callback(done)
+
+    def _open_journal(self):
+        """记录到下载日志，并确保使用 .part 文件断点续传"""
+        if not (self.settings['journal'] and self.settings['job_id']):
+            return
+        self.options['continuedl'] = True
+        self.options['nopart'] = False
+        try:
+            self._journal = get_journal()
+            self._journal.record(self.settings['job_id'], self.settings['journal'], self.url,
+                                 dict(self.options, **self.settings))
+        except Exception as e:
+            # 日志不可用时不影响下载本身
+            print(f"写入下载日志失败: {str(e)}")
+            self._journal = None
+
+    def remove_journal(self):
+        """从下载日志中删除本任务，之后不会再被恢复"""
+        if self._journal:
+            try:
+                self._journal.remove(self.settings['job_id'])
+            except Exception as e:
+                print(f"删除下载日志失败: {str(e)}")
+
+    def _journal_update(self, **fields):
+        if self._journal:
+            try:
+                self._journal.update(self.settings['job_id'], **fields)
+            except Exception as e:
+                print(f"更新下载日志失败: {str(e)}")
+
+    def _before_download(self, info):
+        # 恢复时使用相同的格式ID，保证续传的 .part 文件和上次下载的是同一个格式
+        self._journal_update(format_id=info.get('format_id'), output_path=info.get('_filename'))
+        if self.settings['turbo']:
+            self._apply_turbo(info)
+        # 记录需要并行下载的流，实际下载时(见 _dl)才开始
+        self._parallel_streams = {}
+        self._stream_results = {}
+        if self.settings['parallel_streams'] and len(info.get('requested_formats') or []) > 1:
+            self._parallel_streams = {fmt['format_id']: fmt for fmt in info['requested_formats']}
+
+    def _dl(self, name, info, subtitle=False, test=False):
+        """替代 YoutubeDL.dl：合并格式逐个下载第一个流时，同时下载所有的流
+
+        yt-dlp只在确实需要下载、目标文件也不存在时才逐个调用 dl 下载各个流
+        (跳过下载、文件已存在或由ffmpeg直接合并下载时都不会走到这里)，
+        所以在这里而不是在 before_dl 阶段并行下载。
+        """
+        self._resume_from(name)
+        streams = self._parallel_streams
+        if subtitle or test or not streams or info.get('format_id') not in streams:
+            return yt_dlp.YoutubeDL.dl(self.ydl, name, info, subtitle, test)
+        if not self._stream_results:
+            self._download_streams(name, info)
+        result = self._stream_results.get(info['format_id'])
+        if isinstance(result, tuple):
+            return result
+        # 并行下载失败的流按原来的方式重试(从 .part 文件续传)
+        return yt_dlp.YoutubeDL.dl(self.ydl, name, info, subtitle, test)
+
+    def _download_streams(self, name, first_info):
+        """同时下载合并格式的各个流
+
+        文件名与yt-dlp逐个下载时使用的临时文件名相同(如 name.f137.mp4)，
+        由第一个流的文件名推出其他流的文件名。之后yt-dlp下载其他流时直接返回这里的结果。
+        """
+        suffix = f".f{first_info['format_id']}.{first_info['ext']}"
+        if name == '-' or not name.endswith(suffix):
+            self._parallel_streams = {}
+            return
+        base = name[:-len(suffix)]
+        streams = []
+        for format_id, fmt in self._parallel_streams.items():
+            stream_info = dict(first_info)
+            stream_info.update(fmt)
+            streams.append((format_id, f"{base}.f{format_id}.{fmt['ext']}", stream_info))
+
+        def download(format_id, filename, stream_info):
+            self._resume_from(filename)
+            try:
+                self._stream_results[format_id] = yt_dlp.YoutubeDL.dl(self.ydl, filename, stream_info)
+            except Exception as e:
+                self._stream_results[format_id] = e
+
+        self._progress.begin_group([filename for _, filename, _ in streams])
+        try:
+            threads = [threading.Thread(target=download, args=stream, daemon=True)
+                       for stream in streams]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self._progress.end_group()
+
+        if self.is_cancelled:
+            raise yt_dlp.utils.DownloadCancelled("下载已取消")
+        for result in self._stream_results.values():
+            if isinstance(result, Exception):
+                print(f"并行下载失败，改为逐个下载: {str(result)}")
+
+    def _resume_from(self, filename):
+        """续传时 downloaded_bytes 包含已在 .part 文件中的字节，以其大小为起点，不重复计入带宽和指标"""
+        if filename in self._last_bytes or not self.ydl.params.get('continuedl', True):
+            return
+        part_file = filename if self.ydl.params.get('nopart') else filename + '.part'
+        try:
+            self._last_bytes[filename] = os.path.getsize(part_file)
+        except OSError:
+            pass
+
+    def _apply_turbo(self, info):
+        """按调节器当前的档位设置并发分片数和分块大小，yt-dlp在开始下载文件时读取"""
+        # 按实际提供媒体数据的主机调节，而不是网页地址的主机
+        formats = info.get('requested_formats') or [info]
+        self._turbo_host = urlparse(formats[0].get('url') or self.url).hostname
+        level, fragments, chunk_size = turbo_tuner.choose(
+            self._turbo_host, self.settings['turbo_max_fragments'],
+            self.settings['turbo_max_chunk_size'])
+        self._turbo_level = level
+        self.ydl.params['concurrent_fragment_downloads'] = fragments
+        self.ydl.params['http_chunk_size'] = chunk_size
+
+    def _download(self):
+        """下载视频，分析阶段已缓存信息时跳过重复提取"""
+        cached = info_cache.get(self.url)
+        if cached is not None:
+            try:
+                return self._process(cached)
+            except yt_dlp.utils.DownloadError:
+                if self.is_cancelled:
+                    raise
+                # 缓存的下载地址可能已失效，重新提取
+                info_cache.invalidate(self.url)
+
+        # 提取和下载分两步执行，以便分别统计耗时
+        started = time.monotonic()
+        ie_result = self.ydl.extract_info(self.url, download=False, process=False)
+        self._observe(metrics.extraction_seconds, time.monotonic() - started)
+        return self._process(ie_result)
+
+    def _process(self, ie_result):
+        """选择格式、下载并执行后处理"""
+        started = time.monotonic()
+        self._postprocess_time = 0.0
+        info = self.ydl.process_ie_result(ie_result, download=True)
+        self._observe(metrics.download_seconds, time.monotonic() - started - self._postprocess_time)
+        return info
+
+    def _observe(self, histogram, elapsed, **labels):
+        """记录阶段耗时，同时保留一份供 pop_stats 取走"""
+        histogram.observe(elapsed, **labels)
+        self._timings.append((histogram.name, elapsed, labels))
+
+    def pop_stats(self):
+        """返回 (实际传输的字节数, 当前速度, 上次调用以来记录的阶段耗时)
+
+        worker进程中记录的指标不会出现在API进程中，随事件回传后由worker池汇总。
+        """
+        timings, self._timings = self._timings, []
+        return self.bytes_transferred, self.speed, timings
+
+    def progress_hook(self, progress):
+        # 每次进度更新时检查是否取消，抛出异常以中断下载过程
+        if self.is_cancelled:
+            raise yt_dlp.utils.DownloadCancelled("下载已取消")
+
+        if progress['status'] == 'downloading':
+            self._account(progress)
+        elif progress['status'] == 'finished' and self._turbo_level is not None:
+            turbo_tuner.report(
+                self._turbo_host, self._turbo_level,
+                progress.get('total_bytes') or progress.get('downloaded_bytes') or 0,
+                progress.get('elapsed'), self.settings['turbo_max_fragments'],
+                self.settings['turbo_max_chunk_size'])
+        self._progress.update(progress)
+
+    def _account(self, progress):
+        """带宽、指标和下载日志需要每个数据块的字节数，不受进度采样影响"""
+        # 按新增字节数从全局带宽预算中扣除，超出份额时在下载线程中等待
+        filename = progress.get('filename')
+        downloaded = progress.get('downloaded_bytes') or 0
+        last = self._last_bytes.get(filename, 0)
+        if downloaded < last:
+            # 没有续传，从头开始下载
+            last = 0
+        self._last_bytes[filename] = downloaded
+        if downloaded > last:
+            self.bytes_transferred += downloaded - last
+            bandwidth_manager.consume(self._bandwidth_handle, downloaded - last)
+            metrics.downloaded_bytes_total.inc(downloaded - last)
+        self.speed = progress.get('speed') or 0
+        set_speed(id(self), self.speed)
+
+        now = time.monotonic()
+        if self._journal and now - self._journal_saved >= JOURNAL_INTERVAL:
+            self._journal_saved = now
+            self._journal_update(bytes_done=sum(self._last_bytes.values()))
+
+    def _report_progress(self, record):
+        if self.on_progress:
+            self.on_progress(record)
+
+    def postprocessor_hook(self, progress):
+        """统计每个后处理器的耗时"""
+        name = progress.get('postprocessor')
+        if name == _BeforeDownloadPP.pp_key():
+            return
+        if progress['status'] == 'started':
+            self._postprocess_started[name] = time.monotonic()
+            self.speed = 0
+            set_speed(id(self), None)
+        elif progress['status'] == 'finished' and name in self._postprocess_started:
+            elapsed = time.monotonic() - self._postprocess_started.pop(name)
+            self._postprocess_time += elapsed
+            self._observe(metrics.postprocess_seconds, elapsed, postprocessor=name)
+
+    def cancel(self):
+        """请求取消下载，下载线程会在下一次进度回调时停止"""
+        super().cancel()
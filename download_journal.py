@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils import serializable_options
+
+
+class DownloadJournal:
+    """未完成下载的持久化日志
+
+    下载开始时记录URL和下载选项，确定格式后记录实际的格式ID和输出路径，
+    下载过程中定期记录已下载字节数；正常结束(完成、失败或取消)时删除记录。
+    程序异常退出后留下的记录即为需要恢复的下载。
+    """
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.expanduser("~/youtube_downloader_journal.db")
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS journal (
+                    job_id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    format_id TEXT,
+                    output_path TEXT,
+                    bytes_done INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_source ON journal(source)")
+
+    @staticmethod
+    def _to_dict(row):
+        entry = dict(row)
+        entry['options'] = json.loads(entry['options'])
+        return entry
+
+    def record(self, job_id, source, url, options):
+        """记录开始的下载，已有记录时保留之前解析出的格式和进度"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO journal (job_id, source, url, options, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(job_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (job_id, source, url, json.dumps(serializable_options(options), ensure_ascii=False), now, now))
+
+    def update(self, job_id, **fields):
+        """更新格式ID、输出路径或已下载字节数"""
+        fields['updated_at'] = time.time()
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE journal SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def remove(self, job_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM journal WHERE job_id = ?", (job_id,))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM journal WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def pending(self, source):
+        """返回某个来源遗留的未完成下载，按开始时间排序"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM journal WHERE source = ? ORDER BY created_at", (source,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+
+def resume_options(entry):
+    """根据日志记录生成续传用的下载选项
+
+    已解析出格式ID时固定使用该格式，避免重新选择到不同的格式而无法利用已有的 .part 文件。
+    """
+    options = dict(entry['options'])
+    if entry.get('format_id'):
+        options['format'] = entry['format_id']
+    options['continuedl'] = True
+    return options
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """获取进程内共享的下载日志，首次使用时才打开数据库"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = DownloadJournal()
+        return _journal
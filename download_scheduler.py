@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import itertools
+
+
+class DownloadScheduler:
+    """下载任务调度器
+
+    固定数量的worker协程从优先级队列中取出任务依次执行，
+    同一优先级内按提交顺序(FIFO)处理，避免大量下载同时争抢带宽和CPU。
+    """
+
+    def __init__(self, runner, max_workers=3):
+        """
+        Args:
+            runner: 执行单个任务的协程函数，签名为 runner(task_id)
+            max_workers: 同时执行的最大任务数
+        """
+        self.runner = runner
+        self.max_workers = max_workers
+        self.active_count = 0
+        self._queue = None
+        self._workers = []
+        self._counter = itertools.count()
+        # 仍在队列中的任务，以及其中已被丢弃、worker取到时跳过的任务
+        self._queued = set()
+        self._discarded = set()
+
+    def start(self):
+        """启动worker协程，必须在事件循环中调用"""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(max(1, self.max_workers))
+        ]
+
+    async def stop(self):
+        """停止所有worker协程"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, task_id, priority=0):
+        """提交任务到队列，priority越大越先执行"""
+        self._queued.add(task_id)
+        self._queue.put_nowait((-priority, next(self._counter), task_id))
+
+    def discard(self, task_id):
+        """丢弃仍在排队的任务，worker取到时直接跳过；已被worker取走的任务不受影响"""
+        if task_id in self._queued:
+            self._discarded.add(task_id)
+
+    @property
+    def queue_depth(self):
+        """当前排队中的任务数"""
+        if self._queue is None:
+            return 0
+        return max(0, self._queue.qsize() - len(self._discarded))
+
+    async def _worker(self):
+        while True:
+            _, _, task_id = await self._queue.get()
+            self._queued.discard(task_id)
+            try:
+                if task_id in self._discarded:
+                    self._discarded.discard(task_id)
+                    continue
+
+                self.active_count += 1
+                try:
+                    await self.runner(task_id)
+                finally:
+                    self.active_count -= 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"任务 {task_id} 执行出错: {str(e)}")
+            finally:
+                self._queue.task_done()
@@ -5,69 +5,62 @@ from PyQt6.QtCore import QThread, pyqtSignal
 from PyQt6.QtWidgets import QApplication, QMessageBox
 import yt_dlp
 import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 from custom_events import ShowMessageEvent, UpdateStatusEvent, UpdateVideoInfoEvent
+from batch import PREFETCH_AHEAD, expand_playlist, info_prefetcher
 from download import YouTubeDownloader
+from download_archive import get_archive
+from download_engine import DownloadJob
+from history_export import export_history
+from my_logger import TaskLogger
 
 class DownloadThread(QThread):
-    progress_signal = pyqtSignal(dict)
+    progress_signal = pyqtSignal(object)  # ProgressRecord，已按固定频率采样
     complete_signal = pyqtSignal(dict)
     error_signal = pyqtSignal(str)
     cancelled_signal = pyqtSignal()  # 新增取消信号
     
-    def __init__(self, url, options):
+    def __init__(self, url, options, job_key=None, job_id=None):
         super().__init__()
         self.url = url
         self.options = options
-        self.is_cancelled = False
-        self.ydl = None
-        
-    def run(self):
-        try:
-            # 添加取消检查的钩子函数
-            self.options['progress_hooks'] = [self.progress_hook]
-            
-            # 添加下载前检查
-            if self.is_cancelled:
-                self.cancelled_signal.emit()
-                return
-                
-            # 创建yt-dlp下载器实例
-            self.ydl = yt_dlp.YoutubeDL(self.options)
-            
-            # 使用下载器类下载视频
-            info = self.ydl.extract_info(self.url, download=True)
-            
-            # 完成下载后再次检查是否被取消
-            if not self.is_cancelled:
-                self.complete_signal.emit(info)
-            else:
-                self.cancelled_signal.emit()
-        except Exception as e:
-            if self.is_cancelled:
-                self.cancelled_signal.emit()
-            else:
-                self.error_signal.emit(str(e))
+        self.job_key = job_key
+        # 记录到下载日志，程序异常退出后下次启动可以断点续传
+        self.job_id = job_id or f"gui_{uuid.uuid4().hex}"
+        # 实际下载由不依赖Qt的DownloadJob完成，这里只负责转发为Qt信号
+        self.job = DownloadJob(
+            url, dict(options, job_id=self.job_id, journal='gui'),
+            on_progress=self.progress_signal.emit,
+            on_complete=self.complete_signal.emit,
+            on_error=self.error_signal.emit,
+            on_cancelled=self.cancelled_signal.emit
+        )
     
-    def progress_hook(self, progress):
-        # 每次进度更新时检查是否取消
-        if self.is_cancelled:
-            # 抛出异常以中断下载过程
-            raise yt_dlp.utils.DownloadCancelled("下载已取消")
+    @property
+    def is_cancelled(self):
+        return self.job.is_cancelled
+
+    @property
+    def is_active(self):
+        """任务是否仍在进行：启用后处理进程池时线程在传输结束后即退出，后处理仍在进行"""
+        return self.isRunning() or not (self.job.wait(0) or self.is_cancelled)
         
-        if progress['status'] == 'downloading':
-            self.progress_signal.emit(progress)
+    def run(self):
+        self.job.run()
     
     def cancel(self):
         # 设置取消标志
-        self.is_cancelled = True
+        self.job.cancel()
         
         # 如果ydl实例已创建，尝试中断它
-        if self.ydl:
+        if self.job.ydl:
             # 尝试直接终止下载
-            if hasattr(self.ydl, '_finish_multiline_status'):
+            if hasattr(self.job.ydl, '_finish_multiline_status'):
                 try:
-                    self.ydl._finish_multiline_status()
+                    self.job.ydl._finish_multiline_status()
                 except:
                     print("下载器实例无法终止")
                     pass
@@ -78,11 +71,142 @@ class DownloadThread(QThread):
         # 强制终止线程
         self.terminate()
         self.wait(1000)  # 等待最多1秒让线程结束
+        # 被强制终止的线程不会执行清理，手动删除下载日志，避免下次启动时被恢复
+        self.job.remove_journal()
         
         # 确保取消信号被发送
         self.cancelled_signal.emit()
 
 
+class BatchDownloadThread(QThread):
+    """下载播放列表或频道
+
+    先平铺展开列表，再由有界线程池并行下载各条目；每个条目开始时预取后面几个条目的信息，
+    列表中的视频不再逐个串行提取。
+    """
+    entries_signal = pyqtSignal(str, list)  # 列表标题, [{'url', 'id', 'title'}]
+    entry_progress_signal = pyqtSignal(int, object)  # 条目序号, ProgressRecord
+    entry_status_signal = pyqtSignal(int, str)  # 条目序号, 状态说明
+    entry_complete_signal = pyqtSignal(int, dict)  # 条目序号, 下载结果信息
+    batch_status_signal = pyqtSignal(int, int, int)  # 已完成数, 失败数, 总数
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, url, options, workers=3, expand=expand_playlist, skip_archived=True):
+        """
+        Args:
+            expand: 展开列表的函数，参数为 (url, options)，返回值与 expand_playlist 相同；
+                条目中带有 options 时用它代替整个批次的下载选项
+            skip_archived: 跳过已以相同格式下载过的条目
+        """
+        super().__init__()
+        self.url = url
+        self.options = options
+        self.workers = workers
+        self.expand = expand
+        self.skip_archived = skip_archived
+        self.entries = []
+        self.is_cancelled = False
+        self._jobs = {}
+        self._completed = 0
+        self._failed = 0
+        self._lock = threading.Lock()
+
+    def run(self):
+        self.entry_status_signal.emit(-1, "正在展开播放列表...")
+        try:
+            playlist = self.expand(self.url, self.options)
+        except Exception as e:
+            self.error_signal.emit(f"展开播放列表失败: {str(e)}")
+            return
+        if playlist is None:
+            self.error_signal.emit("URL不是播放列表或频道")
+            return
+        on_queued = playlist.get('on_queued')
+        if self.is_cancelled:
+            if on_queued:
+                on_queued(False)
+            return
+
+        self.entries = playlist['entries']
+        if on_queued:
+            on_queued(True)
+        self.entries_signal.emit(playlist['title'], self.entries)
+        self._emit_batch_status()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='batch') as executor:
+            for index in range(len(self.entries)):
+                executor.submit(self._download_entry, index)
+
+    def _download_entry(self, index):
+        if self.is_cancelled:
+            self.entry_status_signal.emit(index, "已取消")
+            return
+        entry = self.entries[index]
+        options = entry.get('options') or self.options
+        if self._is_archived(entry):
+            # 已下载过的条目不做任何提取，按完成计
+            self._entry_finished(index, "已下载过，跳过", skipped=True)
+            return
+
+        # 与当前条目同时开始的条目已在下载，预取它们之后的条目
+        start = index + self.workers
+        upcoming = [item for item in self.entries[start:start + PREFETCH_AHEAD]
+                    if not self._is_archived(item)]
+        # 订阅同步的条目带有各自订阅的下载选项，按条目自己的选项提取
+        for item in upcoming:
+            info_prefetcher.prefetch([item['url']], item.get('options') or self.options)
+
+        job_id = f"gui_{uuid.uuid4().hex}"
+        task_logger = options.get('logger')
+        if isinstance(task_logger, TaskLogger):
+            # 每个条目写入自己的日志文件
+            options = dict(options, logger=task_logger.for_entry(job_id, entry['url']))
+        job = DownloadJob(
+            entry['url'], dict(options, job_id=job_id, journal='gui'),
+            on_progress=lambda record: self.entry_progress_signal.emit(index, record),
+            on_complete=lambda info: self._entry_finished(index, "完成", info),
+            on_error=lambda error: self._entry_finished(index, f"失败: {error}"),
+            on_cancelled=lambda: self._entry_finished(index, "已取消")
+        )
+        with self._lock:
+            self._jobs[index] = job
+        self.entry_status_signal.emit(index, "下载中")
+        try:
+            job.run()
+        finally:
+            with self._lock:
+                self._jobs.pop(index, None)
+
+    def _is_archived(self, entry):
+        if not self.skip_archived:
+            return False
+        profile = (entry.get('options') or self.options).get('archive_profile')
+        return profile is not None and get_archive().contains(entry['url'], profile)
+
+    def _entry_finished(self, index, status, info=None, skipped=False):
+        with self._lock:
+            if info is not None or skipped:
+                self._completed += 1
+            elif status != "已取消":
+                self._failed += 1
+        self.entry_status_signal.emit(index, status)
+        if info is not None:
+            self.entry_complete_signal.emit(index, info)
+        self._emit_batch_status()
+
+    def _emit_batch_status(self):
+        with self._lock:
+            completed, failed = self._completed, self._failed
+        self.batch_status_signal.emit(completed, failed, len(self.entries))
+
+    def cancel(self):
+        """取消整个批次：未开始的条目不再下载，进行中的条目在下一次进度回调时停止"""
+        self.is_cancelled = True
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+
+
 # 分析线程类
 class AnalyzeThread(QThread):
     info_ready_signal = pyqtSignal(dict)
@@ -101,4 +225,29 @@ class AnalyzeThread(QThread):
             info = YouTubeDownloader.extract_info(self.url, self.ydl_opts, download=False)
             self.info_ready_signal.emit(info)
         except Exception as e:
-            self.error_signal.emit(f"分析视频时出错: {str(e)}")
\ No newline at end of file
+            self.error_signal.emit(f"分析视频时出错: {str(e)}")
+
+# 导出历史记录线程类
+class HistoryExportThread(QThread):
+    progress_signal = pyqtSignal(int, int)  # 已导出条数, 总条数
+    finished_signal = pyqtSignal(object)  # 导出的条数，取消时为None
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, parent, history_manager, file_path, filters=None):
+        super().__init__(parent)
+        self.history_manager = history_manager
+        self.file_path = file_path
+        self.filters = filters or {}
+        self.is_cancelled = False
+
+    def run(self):
+        try:
+            exported = export_history(
+                self.history_manager, self.file_path, self.filters,
+                progress=self.progress_signal.emit, is_cancelled=lambda: self.is_cancelled)
+            self.finished_signal.emit(exported)
+        except Exception as e:
+            self.error_signal.emit(f"导出历史记录时出错: {str(e)}")
+
+    def cancel(self):
+        self.is_cancelled = True
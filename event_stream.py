@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+
+
+class EventBroker:
+    """任务事件广播器
+
+    下载线程通过 publish() 发布事件，事件被转交到事件循环中分发给所有订阅者。
+    同一任务的进度事件按 progress_interval 合并，只推送时间窗口内的最后一条；
+    状态、完成和错误事件立即推送。
+    """
+
+    def __init__(self, progress_interval=0.5, max_pending=1000):
+        """
+        Args:
+            progress_interval: 同一任务两次进度推送之间的最小间隔(秒)
+            max_pending: 每个订阅者最多积压的事件数，超出后丢弃新事件
+        """
+        self.progress_interval = progress_interval
+        self.max_pending = max_pending
+        self._loop = None
+        self._subscribers = set()
+        self._last_sent = {}
+        self._pending = {}
+
+    def bind(self, loop):
+        """绑定事件循环，必须在发布事件之前调用"""
+        self._loop = loop
+
+    def publish(self, event, task_id, data):
+        """发布事件，可以在任意线程中调用"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._dispatch, event, task_id, data)
+
+    def subscribe(self):
+        """创建一个订阅队列"""
+        queue = asyncio.Queue(self.max_pending)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def _dispatch(self, event, task_id, data):
+        if event != 'progress':
+            # 终态事件会覆盖尚未推送的进度
+            self._pending.pop(task_id, None)
+            self._last_sent.pop(task_id, None)
+            self._broadcast(event, task_id, data)
+            return
+
+        now = self._loop.time()
+        if task_id in self._pending:
+            # 已经安排了推送，只替换为最新进度
+            self._pending[task_id] = data
+            return
+
+        last = self._last_sent.get(task_id)
+        if last is None or now - last >= self.progress_interval:
+            self._last_sent[task_id] = now
+            self._broadcast(event, task_id, data)
+        else:
+            self._pending[task_id] = data
+            self._loop.call_later(last + self.progress_interval - now, self._flush, task_id)
+
+    def _flush(self, task_id):
+        data = self._pending.pop(task_id, None)
+        if data is None:
+            return
+        self._last_sent[task_id] = self._loop.time()
+        self._broadcast('progress', task_id, data)
+
+    def _broadcast(self, event, task_id, data):
+        message = (event, task_id, data)
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                pass
+
+
+def format_sse(event, data):
+    """格式化为 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import os
+
+# (字段, CSV表头)
+EXPORT_COLUMNS = (
+    ('title', '标题'),
+    ('url', 'URL'),
+    ('format', '格式'),
+    ('duration', '时长'),
+    ('size', '大小'),
+    ('resolution', '分辨率'),
+    ('uploader', '来源'),
+    ('filepath', '文件路径'),
+    ('time', '下载时间'),
+)
+# 每次从历史记录存储读取的条数
+CHUNK_SIZE = 1000
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+class _CsvWriter:
+    def __init__(self, file_path):
+        # 带BOM，Excel打开时能正确识别中文
+        self._file = open(file_path, 'w', encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([header for _, header in EXPORT_COLUMNS])
+
+    def write(self, items):
+        self._writer.writerows(
+            [_text(item.get(field)) or '' for field, _ in EXPORT_COLUMNS] for item in items)
+
+    def close(self):
+        self._file.close()
+
+
+class _JsonlWriter:
+    """每行一条完整的历史记录，包括没有单独列的字段"""
+
+    def __init__(self, file_path):
+        self._file = open(file_path, 'w', encoding='utf-8')
+
+    def write(self, items):
+        self._file.writelines(json.dumps(item, ensure_ascii=False) + '\n' for item in items)
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    """按列存储，每一批记录写为一个行组；需要安装pyarrow"""
+
+    def __init__(self, file_path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception("导出Parquet格式需要安装pyarrow: pip install pyarrow")
+        self._pa = pyarrow
+        self._schema = pyarrow.schema([(field, pyarrow.string()) for field, _ in EXPORT_COLUMNS])
+        self._writer = pyarrow.parquet.ParquetWriter(file_path, self._schema)
+
+    def write(self, items):
+        columns = {field: [_text(item.get(field)) for item in items] for field, _ in EXPORT_COLUMNS}
+        self._writer.write_table(self._pa.Table.from_pydict(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+# 扩展名 -> (名称, 写入器)
+EXPORT_FORMATS = {
+    '.csv': ('CSV', _CsvWriter),
+    '.jsonl': ('JSON Lines', _JsonlWriter),
+    '.parquet': ('Parquet', _ParquetWriter),
+}
+
+
+def export_history(history_manager, file_path, filters=None, progress=None, is_cancelled=None):
+    """按文件扩展名选择格式，流式导出历史记录
+
+    分批从历史记录存储读取并立即写出，占用的内存与历史记录的总数无关。
+    先写入临时文件，完成后再替换目标文件，中途出错或取消不会留下不完整的文件。
+
+    Args:
+        filters: 搜索和日期筛选条件，见 HistoryManager.query
+        progress: 进度回调 progress(已导出条数, 总条数)
+        is_cancelled: 返回True时停止导出
+
+    Returns:
+        导出的条数；取消时返回None
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise Exception(f"不支持的导出格式: {extension or file_path}")
+    filters = filters or {}
+    total = history_manager.count(**filters)
+    temp_path = file_path + '.part'
+    writer = EXPORT_FORMATS[extension][1](temp_path)
+    exported = 0
+    try:
+        for items in history_manager.iter_history(**filters, chunk_size=CHUNK_SIZE):
+            if is_cancelled and is_cancelled():
+                writer.close()
+                os.remove(temp_path)
+                return None
+            writer.write(items)
+            exported += len(items)
+            if progress:
+                progress(exported, total)
+        writer.close()
+        os.replace(temp_path, file_path)
+        return exported
+    except Exception:
+        writer.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
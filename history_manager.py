@@ -2,65 +2,360 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
 import json
+import sqlite3
+import threading
 from datetime import datetime
 
+# 单独保存为列的历史记录字段，其他字段以JSON保存在 extra 列中
+HISTORY_FIELDS = ('title', 'url', 'format', 'duration', 'size', 'resolution', 'uploader',
+                  'filepath', 'time')
+# 每追加这么多条记录做一次压缩
+COMPACT_EVERY = 500
+
+# 全文索引的字段
+SEARCH_FIELDS = ('title', 'uploader', 'url', 'format')
+# 可排序的字段，下载时间按记录ID排序(与追加顺序一致)；
+# 时长、大小和分辨率按写入时计算的数值排序，而不是按显示的字符串
+SORT_FIELDS = {'time': 'id', 'title': 'title', 'duration': 'duration_seconds', 'size': 'size_bytes',
+               'format': 'format', 'resolution': 'resolution_height', 'uploader': 'uploader'}
+# 有索引的排序列
+INDEXED_COLUMNS = ('time', 'title', 'format', 'uploader',
+                   'duration_seconds', 'size_bytes', 'resolution_height')
+_SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+# trigram分词的最短匹配长度，更短的关键词用LIKE匹配
+TRIGRAM_LENGTH = 3
+
+
+
+def _parse_duration(text):
+    """'1:02:03' 或 '2:03' 格式的时长转为秒数，无法解析时返回None"""
+    try:
+        seconds = 0
+        for part in text.split(':'):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except (AttributeError, ValueError):
+        return None
+
+
+def _parse_size(text):
+    """format_size 格式的大小(如 '10.2 GB')转为字节数，无法解析时返回None"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?B)\s*', text or '', re.IGNORECASE)
+    if not match:
+        return None
+    try:
+        return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+    except ValueError:
+        return None
+
+
+def _parse_resolution(text):
+    """'1920x1080' 或 '720p' 格式的分辨率转为高度，无法解析时返回None"""
+    match = re.search(r'(\d+)x(\d+)|(\d+)p', text or '')
+    if not match:
+        return None
+    return int(match.group(2) or match.group(3))
+
+
+# 排序用的数值列: (来源字段, 计算函数)，写入记录时计算
+SORT_KEYS = {
+    'duration_seconds': ('duration', _parse_duration),
+    'size_bytes': ('size', _parse_size),
+    'resolution_height': ('resolution', _parse_resolution),
+}
+
+_INSERT = (f"INSERT INTO history ({', '.join(HISTORY_FIELDS)}, extra, {', '.join(SORT_KEYS)}) "
+           f"VALUES ({', '.join('?' * (len(HISTORY_FIELDS) + 1 + len(SORT_KEYS)))})")
+
+
 class HistoryManager:
-    def __init__(self, history_file=None):
+    """下载历史记录
+
+    保存在SQLite(WAL模式)中，每条记录单独追加，写入代价与已有记录数无关，
+    写入中途崩溃也只会丢失当前这一条。第一次使用时从旧版的JSON文件导入。
+    """
+
+    def __init__(self, history_file=None, db_path=None):
         if history_file is None:
-            # 默认保存在用户目录下
+            # 旧版本保存历史记录的JSON文件，只用于导入
             self.history_file = os.path.expanduser("~/youtube_downloader_history.json")
         else:
             self.history_file = history_file
-        
-    def save_history(self, history_list):
-        """保存下载历史到文件"""
+        if db_path is None:
+            # 默认保存在用户目录下
+            db_path = os.path.expanduser("~/youtube_downloader_history.db")
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._appended = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            columns = ', '.join(f"{name} TEXT" for name in HISTORY_FIELDS)
+            sort_columns = ', '.join(f"{name} INTEGER" for name in SORT_KEYS)
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    {columns},
+                    extra TEXT,
+                    {sort_columns}
+                )
+            """)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._add_sort_keys()
+            for name in INDEXED_COLUMNS:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_history_{name} ON history({name})")
+        self._tokenizer = self._init_search_index()
+        self._migrate_json()
+
+    def _init_search_index(self):
+        """创建全文索引，返回使用的分词器；SQLite不支持FTS5时返回None，搜索退回LIKE
+
+        trigram分词支持任意语言的子串匹配(包括不以空格分词的中文)，
+        较旧的SQLite不支持时使用unicode61分词加前缀匹配。
+        """
+        row = self._conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'").fetchone()
+        if row:
+            return 'trigram' if 'trigram' in row[0] else 'unicode61'
+        columns = ', '.join(SEARCH_FIELDS)
+        for tokenizer in ('trigram', 'unicode61'):
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        f"CREATE VIRTUAL TABLE history_fts USING fts5({columns}, "
+                        f"content='history', content_rowid='id', tokenize='{tokenizer}')")
+                    # 外部内容表，由触发器与历史记录保持同步
+                    self._conn.execute(f"""
+                        CREATE TRIGGER history_fts_insert AFTER INSERT ON history BEGIN
+                            INSERT INTO history_fts(rowid, {columns})
+                            VALUES (new.id, {', '.join('new.' + name for name in SEARCH_FIELDS)});
+                        END
+                    """)
+                    self._conn.execute(f"""
+                        CREATE TRIGGER history_fts_delete AFTER DELETE ON history BEGIN
+                            INSERT INTO history_fts(history_fts, rowid, {columns})
+                            VALUES ('delete', old.id, {', '.join('old.' + name for name in SEARCH_FIELDS)});
+                        END
+                    """)
+                    # 为已有的记录建立索引
+                    self._conn.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+                return tokenizer
+            except sqlite3.OperationalError:
+                continue
+        return None
+
+    def _add_sort_keys(self):
+        """旧版本创建的数据库没有排序用的数值列，添加后为已有的记录计算"""
+        existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(history)")}
+        missing = [name for name in SORT_KEYS if name not in existing]
+        if not missing:
+            return
+        for name in missing:
+            self._conn.execute(f"ALTER TABLE history ADD COLUMN {name} INTEGER")
+        rows = self._conn.execute("SELECT id, duration, size, resolution FROM history").fetchall()
+        self._conn.executemany(
+            f"UPDATE history SET {', '.join(name + ' = ?' for name in SORT_KEYS)} WHERE id = ?",
+            [(*(parse(row[field]) for field, parse in SORT_KEYS.values()), row['id']) for row in rows])
+
+    @staticmethod
+    def _to_row(item):
+        extra = {key: value for key, value in item.items() if key not in HISTORY_FIELDS}
+        return (*(item.get(name) for name in HISTORY_FIELDS),
+                json.dumps(extra, ensure_ascii=False) if extra else None,
+                *(parse(item.get(field)) for field, parse in SORT_KEYS.values()))
+
+    @staticmethod
+    def _to_item(row):
+        item = {name: row[name] for name in HISTORY_FIELDS if row[name] is not None}
+        if row['extra']:
+            item.update(json.loads(row['extra']))
+        item['id'] = row['id']
+        return item
+
+    def _migrate_json(self):
+        """一次性导入旧版JSON历史记录，导入后把原文件改名保留"""
+        if not os.path.exists(self.history_file):
+            return
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if row is None:
+                try:
+                    with open(self.history_file, 'r', encoding='utf-8') as f:
+                        items = json.load(f)
+                except Exception as e:
+                    print(f"导入历史记录失败: {str(e)}")
+                    return
+                # 导入和标记在同一事务中，中途失败时下次重新导入
+                with self._conn:
+                    self._conn.executemany(
+                        _INSERT, [self._to_row(item) for item in items if isinstance(item, dict)])
+                    self._conn.execute(
+                        "INSERT INTO meta (key, value) VALUES ('json_migrated', ?)",
+                        (datetime.now().isoformat(),))
         try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(history_list, f, ensure_ascii=False, indent=2)
-            return True
-        except Exception as e:
-            print(f"保存历史记录失败: {str(e)}")
-            return False
-    
+            os.replace(self.history_file, self.history_file + '.migrated')
+        except OSError as e:
+            print(f"重命名旧历史记录文件失败: {str(e)}")
+
+    def append(self, item):
+        """追加一条历史记录，返回记录ID"""
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(_INSERT, self._to_row(item))
+            self._appended += 1
+            compact = self._appended % COMPACT_EVERY == 0
+        if compact:
+            self.compact()
+        return cursor.lastrowid
+
     def load_history(self):
-        """从文件加载下载历史"""
-        if not os.path.exists(self.history_file):
-            return []
-        
+        """加载全部下载历史，按下载顺序排列"""
         try:
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with self._lock:
+                rows = self._conn.execute("SELECT * FROM history ORDER BY id").fetchall()
+            return [self._to_item(row) for row in rows]
         except Exception as e:
             print(f"加载历史记录失败: {str(e)}")
             return []
-    
+
+    def _where(self, search=None, date_from=None, date_to=None):
+        """生成搜索和日期筛选条件，全部在数据库中完成，不在Python中逐条过滤"""
+        conditions = []
+        params = []
+        fts_terms = []
+        for term in (search or '').split():
+            if self._tokenizer == 'trigram' and len(term) >= TRIGRAM_LENGTH:
+                fts_terms.append('"{}"'.format(term.replace('"', '""')))
+            elif self._tokenizer == 'unicode61':
+                fts_terms.append('"{}"*'.format(term.replace('"', '""')))
+            else:
+                # 太短无法使用trigram索引的关键词
+                pattern = '%{}%'.format(term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+                conditions.append('(' + ' OR '.join(f"{name} LIKE ? ESCAPE '\\'" for name in SEARCH_FIELDS) + ')')
+                params.extend([pattern] * len(SEARCH_FIELDS))
+        if fts_terms:
+            conditions.append("id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)")
+            params.append(' '.join(fts_terms))
+        # 下载时间格式为 'YYYY-MM-DD HH:MM:SS'，可以直接按字符串比较
+        if date_from:
+            conditions.append("time >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("time < ?")
+            params.append(date_to)
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def query(self, search=None, date_from=None, date_to=None, sort='time', descending=True,
+              offset=0, limit=200, after=None):
+        """搜索、筛选并排序历史记录，分页返回
+
+        Args:
+            search: 关键词，以空格分隔，需全部出现在标题、来源、URL或格式中
+            date_from: 只返回此时间及之后的记录，如 '2024-01-01'
+            date_to: 只返回此时间之前的记录
+            sort: 排序字段，见 SORT_FIELDS
+            after: 上一页最后一条记录的ID，从它之后继续读取；
+                按索引定位，翻到很深的页也不需要像OFFSET那样跳过前面的所有记录
+        """
+        where, params = self._where(search, date_from, date_to)
+        column = SORT_FIELDS.get(sort, 'id')
+        direction = 'DESC' if descending else 'ASC'
+        order = f"{column} {direction}" + (f", id {direction}" if column != 'id' else "")
+        with self._lock:
+            if after is None:
+                return [self._to_item(row) for row in self._conn.execute(
+                    f"SELECT * FROM history{where} ORDER BY {order} LIMIT ? OFFSET ?",
+                    (*params, limit, offset))]
+            rows = []
+            # 依次读取排在 after 之后的各段，每段都可以直接在索引上定位
+            for condition, segment_params in self._after(column, descending, after):
+                segment_where = f"{where} AND {condition}" if where else f" WHERE {condition}"
+                rows += self._conn.execute(
+                    f"SELECT * FROM history{segment_where} ORDER BY {order} LIMIT ? OFFSET ?",
+                    (*params, *segment_params, limit - len(rows), offset)).fetchall()
+                offset = 0
+                if len(rows) >= limit:
+                    break
+        return [self._to_item(row) for row in rows]
+
+    def _after(self, column, descending, last_id):
+        """排在记录 last_id 之后的各段条件，按 (排序列, id) 比较
+
+        SQLite中NULL小于任何值：升序时排在最前，降序时排在最后。
+        与NULL有关的部分单独成段，不用OR连接，否则无法在索引上定位。
+        """
+        if column == 'id':
+            return [("id < ?" if descending else "id > ?", [last_id])]
+        row = self._conn.execute(f"SELECT {column} FROM history WHERE id = ?", (last_id,)).fetchone()
+        value = row[0] if row else None
+        if descending:
+            if value is None:
+                return [(f"{column} IS NULL AND id < ?", [last_id])]
+            return [(f"({column}, id) < (?, ?)", [value, last_id]), (f"{column} IS NULL", [])]
+        if value is None:
+            return [(f"{column} IS NULL AND id > ?", [last_id]), (f"{column} IS NOT NULL", [])]
+        return [(f"({column}, id) > (?, ?)", [value, last_id])]
+
+    def iter_history(self, search=None, date_from=None, date_to=None, chunk_size=1000):
+        """按下载顺序分批迭代符合条件的历史记录，每批为一个列表
+
+        按记录ID翻页而不是OFFSET，每一批的查询代价相同；批与批之间不持有锁，不阻塞写入。
+        """
+        where, params = self._where(search, date_from, date_to)
+        where += " AND id > ?" if where else " WHERE id > ?"
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT * FROM history{where} ORDER BY id LIMIT ?",
+                    (*params, last_id, chunk_size)).fetchall()
+            if not rows:
+                return
+            yield [self._to_item(row) for row in rows]
+            last_id = rows[-1]['id']
+
+    def count(self, search=None, date_from=None, date_to=None):
+        """符合条件的记录数"""
+        where, params = self._where(search, date_from, date_to)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM history{where}", params).fetchone()[0]
+
+    def clear(self):
+        """清空历史记录"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM history")
+        self.compact()
+
+    def compact(self):
+        """把WAL合并回数据库文件并截断，删除过记录后回收空闲页"""
+        try:
+            with self._lock:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                free_pages = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+                total_pages = self._conn.execute("PRAGMA page_count").fetchone()[0]
+                if free_pages and free_pages * 4 > total_pages:
+                    self._conn.execute("VACUUM")
+        except sqlite3.Error as e:
+            print(f"压缩历史记录失败: {str(e)}")
+
     def add_history_item(self, title, url, format_option):
         """创建一个新的历史记录项"""
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
+
         # 处理标题：去除路径和扩展名
         if title and isinstance(title, str):
             # 先去除路径
             title = os.path.basename(title)
             # 再去除扩展名
             title = os.path.splitext(title)[0]
-        
+
         return {
             'title': title,
             'url': url,
             'format': format_option,
             'time': now
         }
-    
-    def export_history_to_csv(self, file_path, history_list):
-        """导出历史记录到CSV文件"""
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write("标题,URL,格式,下载时间\n")
-                for item in history_list:
-                    f.write(f"{item.get('title', '未知')},{item.get('url', '')},{item.get('format', '')},{item.get('time', '')}\n")
-            return True
-        except Exception as e:
-            print(f"导出历史记录失败: {str(e)}")
-            return False
\ No newline at end of file
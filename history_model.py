@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QEvent, QModelIndex, pyqtSignal
+from PyQt6.QtWidgets import (QApplication, QStyle, QStyleOptionButton, QStyledItemDelegate,
+                             QTableView, QHeaderView)
+
+# (表头, 字段, 缺省显示)，第一列为播放按钮
+HISTORY_COLUMNS = (
+    ("", None, ""),
+    ("标题", 'title', '未知'),
+    ("时长", 'duration', '--:--'),
+    ("大小", 'size', '未知'),
+    ("格式", 'format', '未知'),
+    ("分辨率", 'resolution', '未知'),
+    ("来源", 'uploader', '未知'),
+    ("下载时间", 'time', ''),
+)
+# 每次从历史记录存储读取的条数
+PAGE_SIZE = 200
+
+
+class HistoryModel(QAbstractTableModel):
+    """下载历史的表格模型
+
+    默认按从新到旧的顺序显示，滚动到底部时才从历史记录存储读取下一页，
+    打开很大的历史记录也只读取第一页。搜索、筛选和排序都交给历史记录存储的索引完成。
+    """
+
+    def __init__(self, history_manager, parent=None):
+        super().__init__(parent)
+        self.history_manager = history_manager
+        self._items = []
+        self._exhausted = False
+        self._filters = {}
+        self._sort = 'time'
+        self._descending = True
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._items)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HISTORY_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return HISTORY_COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self._items[index.row()]
+        _, field, default = HISTORY_COLUMNS[index.column()]
+        if role == Qt.ItemDataRole.DisplayRole and field:
+            return item.get(field) or default
+        if role == Qt.ItemDataRole.ToolTipRole and field == 'title':
+            return item.get('filepath') or item.get('url')
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        page = self.history_manager.query(
+            **self._filters, sort=self._sort, descending=self._descending,
+            after=self._items[-1]['id'] if self._items else None, limit=PAGE_SIZE)
+        if len(page) < PAGE_SIZE:
+            self._exhausted = True
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self._items), len(self._items) + len(page) - 1)
+            self._items.extend(page)
+            self.endInsertRows()
+
+    def item(self, row):
+        """返回某一行的历史记录"""
+        return self._items[row]
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """点击表头排序，播放按钮列按下载时间排序"""
+        self._sort = HISTORY_COLUMNS[column][1] or 'time'
+        self._descending = order == Qt.SortOrder.DescendingOrder
+        self.reload()
+
+    def set_filters(self, search=None, date_from=None, date_to=None):
+        """设置搜索关键词和日期范围，None表示不限"""
+        self._filters = {key: value for key, value in
+                         (('search', search), ('date_from', date_from), ('date_to', date_to)) if value}
+        self.reload()
+
+    def filters(self):
+        """当前的搜索和筛选条件，可直接传给 HistoryManager.query"""
+        return dict(self._filters)
+
+    def matching_count(self):
+        """符合当前搜索和筛选条件的记录数"""
+        return self.history_manager.count(**self._filters)
+
+    def prepend(self, item):
+        """新完成的下载插入到最前面；有筛选或其他排序时重新查询，由索引决定它的位置"""
+        if self._filters or self._sort != 'time' or not self._descending:
+            self.reload()
+            return
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._items.insert(0, item)
+        self.endInsertRows()
+
+    def reload(self):
+        """清空已读取的记录，重新从第一页开始读取"""
+        self.beginResetModel()
+        self._items = []
+        self._exhausted = False
+        self.endResetModel()
+
+
+class PlayButtonDelegate(QStyledItemDelegate):
+    """绘制播放按钮的委托，不为每一行创建按钮控件"""
+
+    play_requested = pyqtSignal(int)  # 行号
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(4, 2, -4, -2)
+        button.text = "▶"
+        button.state = QStyle.StateFlag.State_Enabled
+        QApplication.style().drawControl(QStyle.ControlElement.CE_PushButton, button, painter)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.Type.MouseButtonRelease and option.rect.contains(event.position().toPoint()):
+            self.play_requested.emit(index.row())
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+def create_history_view(model, on_play):
+    """创建显示下载历史的表格视图，点击播放按钮时以该行的历史记录调用 on_play"""
+    view = QTableView()
+    view.setModel(model)
+    view.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+    header = view.horizontalHeader()
+    header.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)  # 标题列自适应
+
+    # 设置列宽
+    view.setColumnWidth(0, 40)  # 图标列
+    view.setColumnWidth(2, 80)  # 时长列
+    view.setColumnWidth(3, 80)  # 大小列
+    view.setColumnWidth(4, 80)  # 格式列
+    view.setColumnWidth(5, 80)  # 分辨率列
+    view.setColumnWidth(6, 150)  # 来源列
+    view.setColumnWidth(7, 140)  # 下载时间列
+
+    delegate = PlayButtonDelegate(view)
+    delegate.play_requested.connect(lambda row: on_play(model.item(row)))
+    view.setItemDelegateForColumn(0, delegate)
+    return view
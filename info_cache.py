@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import yt_dlp
+
+from utils import normalize_video_key
+
+
+class InfoCache:
+    """视频信息缓存
+
+    以规范化后的视频ID为键缓存yt-dlp提取的视频信息，带过期时间和LRU淘汰。
+    分析时缓存的信息可以在下载时通过 process_ie_result 直接复用，省去一次完整的提取。
+    """
+
+    def __init__(self, max_entries=64, ttl=1800):
+        """
+        Args:
+            max_entries: 最多缓存的视频数
+            ttl: 缓存有效期(秒)，视频格式的下载地址会过期，不宜过长
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """获取缓存的视频信息，返回独立的副本；未命中或已过期时返回None"""
+        key = normalize_video_key(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(data)
+
+    def contains(self, url):
+        """是否有未过期的缓存，不复制缓存内容"""
+        with self._lock:
+            entry = self._entries.get(normalize_video_key(url))
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def put(self, url, info):
+        """缓存视频信息，只缓存单个视频"""
+        if not info or info.get('_type', 'video') != 'video':
+            return
+        # 以JSON形式保存，取出时反序列化即得到可安全修改的副本
+        data = json.dumps(yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True))
+        key = normalize_video_key(url)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, url):
+        with self._lock:
+            self._entries.pop(normalize_video_key(url), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# 进程内共享的缓存实例，分析和下载都使用它
+info_cache = InfoCache()
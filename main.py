@@ -3,6 +3,7 @@
 
 import sys
 import os
+import multiprocessing
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QIcon
 from ui import YoutubeDownloader
@@ -32,4 +33,6 @@ def main():
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    # 打包后的程序启动后处理等子进程时需要
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
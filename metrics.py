@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+
+# 默认的耗时分布桶(秒)
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值，也可以在采集时通过函数取值"""
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        """采集时调用function获取当前值，只适用于没有标签的指标"""
+        self._function = function
+
+    def collect(self):
+        if self._function is not None:
+            self.set(self._function())
+        return super().collect()
+
+
+class Histogram(_Metric):
+    """耗时等数值的分布统计"""
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """指标注册表，负责输出Prometheus文本格式"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# 任务生命周期
+queue_depth = registry.register(Gauge(
+    'vd_queue_depth', '排队等待下载的任务数'))
+active_workers = registry.register(Gauge(
+    'vd_active_workers', '正在执行任务的worker数'))
+downloads_total = registry.register(Counter(
+    'vd_downloads_total', '结束的下载任务数', ['status']))
+download_errors_total = registry.register(Counter(
+    'vd_download_errors_total', '下载失败次数', ['cause']))
+
+# 数据量和速度
+downloaded_bytes_total = registry.register(Counter(
+    'vd_downloaded_bytes_total', '累计下载的字节数'))
+download_speed_bytes = registry.register(Gauge(
+    'vd_download_speed_bytes', '所有进行中下载的当前总速度(字节/秒)'))
+
+# 各阶段耗时
+extraction_seconds = registry.register(Histogram(
+    'vd_extraction_seconds', '视频信息提取耗时'))
+download_seconds = registry.register(Histogram(
+    'vd_download_seconds', '下载阶段耗时(不含信息提取和后处理)'))
+postprocess_seconds = registry.register(Histogram(
+    'vd_postprocess_seconds', '后处理耗时', ['postprocessor']))
+
+
+def classify_error(error):
+    """将下载异常归类为便于统计的原因"""
+    original = getattr(error, 'exc_info', None)
+    if original and original[1] is not None:
+        error = original[1]
+    name = type(error).__name__
+    message = str(error).lower()
+
+    if 'http error 429' in message or 'too many requests' in message:
+        return 'throttled'
+    if 'http error 403' in message or 'forbidden' in message:
+        return 'forbidden'
+    if 'http error 404' in message or 'not found' in message:
+        return 'not_found'
+    if 'postprocessing' in message or 'ffmpeg' in message or name == 'PostProcessingError':
+        return 'postprocess'
+    if name in ('TransportError', 'HTTPError', 'IncompleteRead', 'TimeoutError', 'ConnectionError') \
+            or 'timed out' in message or 'connection' in message:
+        return 'network'
+    if name in ('ExtractorError', 'UnsupportedError', 'GeoRestrictedError') \
+            or 'unsupported url' in message or 'unavailable' in message:
+        return 'extractor'
+    return 'other'
@@ -1,69 +1,269 @@
 from loguru import logger
+import atexit
+import json
 import os
+import queue
 import sys
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
-class MyLogger:
-    _instance = None
-    @classmethod
-    def get_instance(cls, log_file=None):
-        """获取 MyLogger 的单例实例"""
-        if cls._instance is None:
-            cls._instance = cls(log_file)
-        return cls._instance
-    def __init__(self, log_file=None):
-        # 移除默认的 sink
-        logger.remove()
+# 日志级别，可用环境变量 YTDL_LOG_LEVEL 或设置页修改；只有 DEBUG 时yt-dlp才输出详细的调试信息
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+LOG_LEVEL = os.environ.get('YTDL_LOG_LEVEL', 'INFO').upper()
+if LOG_LEVEL not in LOG_LEVELS:
+    LOG_LEVEL = 'INFO'
+_level_no = logger.level(LOG_LEVEL).no
+_DEBUG_NO = logger.level('DEBUG').no
+_INFO_NO = logger.level('INFO').no
+_WARNING_NO = logger.level('WARNING').no
 
-        if hasattr(sys.stdout, "isatty"):
-            format_str = "<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>"
-            # 添加控制台输出
-            logger.add(sys.stderr, level="INFO", format=format_str)
-        
-        
-        
-        # 如果提供了日志文件，添加文件输出
-        if log_file:
-            # 确保日志目录存在
-            log_dir = os.path.dirname(log_file)
-            if not os.path.exists(log_dir):
-                os.makedirs(log_dir)
-                
+# 同时保持打开的任务日志文件数，超出时关闭最久未写入的
+MAX_OPEN_TASK_LOGS = 16
+# 任务日志索引，保存在任务日志所在的目录中，每行一个任务
+TASK_LOG_INDEX = 'index.jsonl'
+
+TASK_LOG_FORMAT = "{time:HH:mm:ss} | {level: <8} | {message}"
+
+
+def set_log_level(level):
+    """修改日志级别，立即对所有日志(包括进行中的下载)生效"""
+    global LOG_LEVEL, _level_no
+    level = level.upper()
+    if level not in LOG_LEVELS:
+        raise ValueError(f"未知的日志级别: {level}")
+    LOG_LEVEL = level
+    _level_no = logger.level(level).no
+
+
+def is_verbose():
+    """是否需要yt-dlp的详细调试输出"""
+    return _level_no <= _DEBUG_NO
+
+
+def _enabled(record):
+    return record['level'].no >= _level_no
+
+
+def _console_filter(record):
+    if 'log_file' in record['extra']:
+        return record['level'].no >= _WARNING_NO
+    return _enabled(record)
+
+
+def task_log_path(log_dir, url=None, task_id=None):
+    """按视频ID和时间戳生成任务日志文件路径
+
+    时间戳只精确到秒，同时开始的多个任务(如批量下载的条目)以任务ID的末尾区分。
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    video_id = url.split('?v=')[-1].split('&')[0] if url and '?v=' in url else 'video'
+    suffix = f'_{task_id[-8:]}' if task_id else ''
+    return os.path.join(log_dir, f'yt-dlp_{video_id}_{timestamp}{suffix}.log')
+
+
+def read_task_log_index(log_dir):
+    """读取日志目录中的任务日志索引，返回 [{'task', 'url', 'log_file', 'started_at'}]"""
+    index_file = os.path.join(log_dir, TASK_LOG_INDEX)
+    if not os.path.exists(index_file):
+        return []
+    entries = []
+    with open(index_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # 写入中途退出留下的不完整行
+    return entries
+
+
+class _TaskLogRouter:
+    """按记录绑定的 log_file 把日志写入各任务自己的文件
+
+    下载线程只把格式化好的消息放入内存队列，由后台线程批量写入文件。
+    不使用loguru的 enqueue=True：它为跨进程而对每条记录序列化并写管道，比直接写文件还慢。
+    """
+
+    def __init__(self):
+        self._files = OrderedDict()
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._run, name='task-log-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def __call__(self, message):
+        self._queue.put((message.record['extra']['log_file'], message))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            written = set()
+            # 一次取完队列中已有的消息，写完后每个文件只刷新一次
+            while item is not None:
+                log_file, message = item
+                try:
+                    f = self._files.pop(log_file, None)
+                    if f is None:
+                        f = self._open(log_file)
+                    self._files[log_file] = f
+                    f.write(message)
+                    written.add(log_file)
+                except OSError as e:
+                    print(f"写入任务日志失败: {log_file}: {str(e)}")
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            for log_file in written:
+                if log_file in self._files:
+                    self._files[log_file].flush()
+            if item is None:
+                break
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def _open(self, log_file):
+        while len(self._files) >= MAX_OPEN_TASK_LOGS:
+            self._files.popitem(last=False)[1].close()
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        f = open(log_file, 'a', encoding='utf-8')
+        if f.tell() == 0:
             # 写入日志头信息
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(f"=== yt-dlp 下载日志 - 开始于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n\n")
-            
-            # 添加文件日志
-            logger.add(
-                log_file, 
-                level="DEBUG", 
-                format="{time:HH:mm:ss} | {level: <8} | {message}",
-                rotation="10 MB",  # 日志文件达到10MB时轮转
-                retention="1 week"  # 保留1周的日志
-            )
-        
-        self.logger = logger
-    
+            f.write(f"=== yt-dlp 下载日志 - 开始于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n\n")
+        return f
+
+    def close(self):
+        """写完队列中的日志后关闭所有文件"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+
+class _YtdlpLoggerMixin:
+    """yt-dlp 的 logger 接口，低于当前日志级别的消息直接丢弃，不进入队列"""
+
     def debug(self, msg):
         # For compatibility with youtube-dl, both debug and info are passed into debug
         # You can distinguish them by the prefix '[debug] '
         if msg.startswith('[debug] '):
-            self.logger.debug(msg[8:])  # 去掉前缀
+            if _level_no <= _DEBUG_NO:
+                self.logger.debug(msg[8:])  # 去掉前缀
         else:
             self.info(msg)
 
     def info(self, msg):
-        self.logger.info(msg)
+        if _level_no <= _INFO_NO:
+            self.logger.info(msg)
 
     def warning(self, msg):
         self.logger.warning(msg)
 
     def error(self, msg):
         self.logger.error(msg)
-        
+
     # 兼容 yt-dlp 的接口
     def report_warning(self, msg):
         self.warning(msg)
-        
+
     def report_error(self, msg):
-        self.error(msg)
\ No newline at end of file
+        self.error(msg)
+
+
+class MyLogger(_YtdlpLoggerMixin):
+    """应用程序日志
+
+    下载任务的日志通过 for_task 绑定各自的日志文件，由同一个后台写入线程分别写入，
+    不写入应用程序日志，控制台也只显示任务的警告和错误。
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, log_file=None):
+        """获取 MyLogger 的单例实例，log_file 为应用程序日志文件"""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls(log_file)
+            elif log_file and cls._instance.log_file is None:
+                # 先创建了任务日志，之后才指定应用程序日志
+                cls._instance._add_app_log(log_file)
+            return cls._instance
+
+    @classmethod
+    def for_task(cls, log_file, task_id=None, url=None):
+        """创建写入单独日志文件的任务日志，并记录到该目录的任务日志索引中"""
+        instance = cls.get_instance()
+        task_id = task_id or os.path.splitext(os.path.basename(log_file))[0]
+        instance._index_task(log_file, task_id, url)
+        return TaskLogger(log_file, task_id, url)
+
+    def __init__(self, log_file=None):
+        # 移除默认的 sink
+        logger.remove()
+
+        if hasattr(sys.stdout, "isatty"):
+            format_str = "<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>"
+            # 添加控制台输出
+            logger.add(sys.stderr, level="INFO", format=format_str, filter=_console_filter)
+
+        # 任务日志
+        self._router = _TaskLogRouter()
+        logger.add(self._router, format=TASK_LOG_FORMAT,
+                   filter=lambda record: 'log_file' in record['extra'] and _enabled(record))
+
+        self.log_file = None
+        self._index_lock = threading.Lock()
+        # 如果提供了日志文件，添加文件输出
+        if log_file:
+            self._add_app_log(log_file)
+
+        self.logger = logger
+
+    def _add_app_log(self, log_file):
+        # 确保日志目录存在
+        log_dir = os.path.dirname(log_file)
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+        # 写入日志头信息
+        with open(log_file, 'a', encoding='utf-8') as f:
+            f.write(f"=== yt-dlp 下载日志 - 开始于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n\n")
+
+        # 添加文件日志，任务日志写入各自的文件
+        logger.add(
+            log_file,
+            level="DEBUG",
+            format=TASK_LOG_FORMAT,
+            filter=lambda record: 'log_file' not in record['extra'] and _enabled(record),
+            rotation="10 MB",  # 日志文件达到10MB时轮转
+            retention="1 week"  # 保留1周的日志
+        )
+        self.log_file = log_file
+
+    def _index_task(self, log_file, task_id, url):
+        log_dir = os.path.dirname(log_file)
+        entry = {'task': task_id, 'url': url, 'log_file': log_file,
+                 'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        try:
+            with self._index_lock:
+                os.makedirs(log_dir, exist_ok=True)
+                with open(os.path.join(log_dir, TASK_LOG_INDEX), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"写入任务日志索引失败: {str(e)}")
+
+
+class TaskLogger(_YtdlpLoggerMixin):
+    """单个下载任务的日志，作为 yt-dlp 的 logger 选项使用"""
+
+    def __init__(self, log_file, task_id, url=None):
+        self.log_file = log_file
+        self.task_id = task_id
+        self.url = url
+        self.logger = logger.bind(task=task_id, log_file=log_file)
+
+    def for_entry(self, task_id, url):
+        """为批量下载中的一个条目创建同目录下的任务日志"""
+        return MyLogger.for_task(task_log_path(os.path.dirname(self.log_file), url, task_id), task_id, url)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import yt_dlp
+
+from postprocessors import create_youtube_dl
+
+# 默认的后处理进程数
+DEFAULT_PROCESSES = 2
+
+
+def _run_postprocess(options, jobs):
+    """后处理进程入口：对已下载的文件执行合并、转码等后处理
+
+    Args:
+        options: 可序列化的yt-dlp选项，用于在本进程中重建后处理器
+        jobs: [(filename, info, files_to_move)]，info中的 __postprocessors 为后处理器类名
+
+    Returns:
+        (每个文件后处理后的路径列表, [(后处理器名称, 耗时秒数)])
+    """
+    timings = []
+    started = {}
+
+    def hook(progress):
+        name = progress.get('postprocessor')
+        if progress['status'] == 'started':
+            started[name] = time.monotonic()
+        elif progress['status'] == 'finished' and name in started:
+            timings.append((name, time.monotonic() - started.pop(name)))
+
+    options = dict(options, postprocessor_hooks=[hook])
+    filepaths = []
+    with create_youtube_dl(options) as ydl:
+        for filename, info, files_to_move in jobs:
+            info['__postprocessors'] = [
+                getattr(yt_dlp.postprocessor, name)(ydl) for name in info.get('__postprocessors') or []]
+            info = ydl.post_process(filename, info, files_to_move)
+            filepaths.append(info.get('filepath'))
+    return filepaths, timings
+
+
+class PostprocessPool:
+    """独立的后处理进程池
+
+    下载线程在网络传输结束后把后处理交给进程池，随即释放下载槽位去下载下一个任务，
+    ffmpeg的CPU工作与其他任务的网络传输并行进行。进程数有上限，避免同时运行过多ffmpeg。
+    """
+
+    def __init__(self, processes=DEFAULT_PROCESSES):
+        self.processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def set_processes(self, processes):
+        """设置进程数，在第一次提交任务之前调用才生效"""
+        if processes:
+            self.processes = processes
+
+    def submit(self, options, jobs):
+        """提交后处理任务，返回 concurrent.futures.Future"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context('spawn'))
+            return self._executor.submit(_run_postprocess, options, jobs)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait)
+
+
+# 进程内共享的后处理进程池，第一次使用时才启动进程
+postprocess_pool = PostprocessPool()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import html
+import os
+import re
+
+import yt_dlp
+from yt_dlp.postprocessor import PostProcessor
+from yt_dlp.utils import replace_extension
+
+# VTT时间戳：[hh:]mm:ss.ttt
+_VTT_TIME = r'(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})'
+_CUE_TIMING = re.compile(rf'^\s*{_VTT_TIME}\s+-->\s+{_VTT_TIME}')
+# SRT只支持 <b> <i> <u>，其他标签(<c.color>、<v 说话人>、卡拉OK时间戳等)去掉
+_TAG = re.compile(r'<(?!/?[biu]>)[^>]*>')
+
+
+def _srt_time(hours, minutes, seconds, millis):
+    return f"{int(hours or 0):02d}:{minutes}:{seconds},{millis}"
+
+
+def _clean_text(line):
+    return html.unescape(_TAG.sub('', line)).replace(' ', ' ')
+
+
+def iter_vtt_cues(lines):
+    """逐行解析VTT，生成 (开始时间, 结束时间, 文本行列表)，时间已是SRT格式"""
+    timing = None
+    text = []
+    skipping = False
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            if timing and text:
+                yield timing[0], timing[1], text
+            timing, text, skipping = None, [], False
+            continue
+        if skipping:
+            continue
+        if timing is None:
+            match = _CUE_TIMING.match(line)
+            if match:
+                groups = match.groups()
+                timing = (_srt_time(*groups[:4]), _srt_time(*groups[4:]))
+            elif line.startswith(('WEBVTT', 'NOTE', 'STYLE', 'REGION')):
+                # 文件头、注释和样式块直到空行为止
+                skipping = True
+            # 其他行是cue标识，忽略
+            continue
+        cleaned = _clean_text(line)
+        if cleaned.strip():
+            text.append(cleaned)
+    if timing and text:
+        yield timing[0], timing[1], text
+
+
+def convert_vtt_to_srt(vtt_path, srt_path):
+    """流式地把VTT字幕文件转换为SRT，返回字幕条数"""
+    count = 0
+    with open(vtt_path, encoding='utf-8-sig') as source, \
+            open(srt_path, 'w', encoding='utf-8') as target:
+        for start, end, text in iter_vtt_cues(source):
+            count += 1
+            target.write(f"{count}\n{start} --> {end}\n")
+            target.write('\n'.join(text))
+            target.write('\n\n')
+    return count
+
+
+class VttToSrtPP(PostProcessor):
+    """纯Python实现的VTT转SRT后处理器
+
+    一次处理一个视频的所有语言字幕，不启动ffmpeg进程，
+    用于替代仅下载字幕时的 FFmpegSubtitlesConvertor。
+    """
+
+    def run(self, info):
+        subtitles = info.get('requested_subtitles') or {}
+        originals = []
+        for lang, sub in subtitles.items():
+            path = sub.get('filepath')
+            if sub.get('ext') != 'vtt' or not path or not os.path.exists(path):
+                continue
+            srt_path = replace_extension(path, 'srt', 'vtt')
+            self.to_screen(f'Converting subtitles "{path}" to srt')
+            convert_vtt_to_srt(path, srt_path)
+            originals.append(path)
+            sub.update(filepath=srt_path, ext='srt')
+            # 与 FFmpegSubtitlesConvertor 一致，更新最终要移动的文件
+            files_to_move = info.get('__files_to_move') or {}
+            if path in files_to_move:
+                files_to_move[srt_path] = replace_extension(files_to_move.pop(path), 'srt', 'vtt')
+        return originals, info
+
+
+# 不属于yt-dlp的后处理器，在下载选项的 postprocessors 中用这里的key引用
+CUSTOM_POSTPROCESSORS = {
+    'VttToSrt': VttToSrtPP,
+}
+
+
+def create_youtube_dl(options):
+    """创建YoutubeDL，下载选项中引用的自定义后处理器在这里注册
+
+    自定义后处理器只以key出现在选项中，下载选项因此仍可以序列化保存。
+    """
+    options = dict(options)
+    custom = [spec for spec in options.get('postprocessors') or []
+              if spec.get('key') in CUSTOM_POSTPROCESSORS]
+    if custom:
+        options['postprocessors'] = [spec for spec in options['postprocessors'] if spec not in custom]
+    ydl = yt_dlp.YoutubeDL(options)
+    for spec in custom:
+        spec = dict(spec)
+        pp_class = CUSTOM_POSTPROCESSORS[spec.pop('key')]
+        when = spec.pop('when', 'post_process')
+        ydl.add_post_processor(pp_class(ydl, **spec), when=when)
+    return ydl
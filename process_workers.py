@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import queue
+import threading
+import time
+
+import metrics
+from bandwidth import bandwidth_manager
+from download_engine import DownloadJob, JobHandle, set_speed
+from progress import ProgressRecord
+
+# 检查worker进程是否存活的间隔(秒)
+WATCH_INTERVAL = 1.0
+
+# worker进程回传的阶段耗时指标
+_HISTOGRAMS = {histogram.name: histogram for histogram in
+               (metrics.extraction_seconds, metrics.download_seconds, metrics.postprocess_seconds)}
+
+
+def _result_payload(info):
+    """下载结果中可以安全跨进程传递的部分"""
+    info = info or {}
+    return {
+        'title': info.get('title'),
+        'webpage_url': info.get('webpage_url'),
+        'requested_downloads': [
+            {'filepath': item.get('filepath')}
+            for item in info.get('requested_downloads') or []
+        ],
+    }
+
+
+def _create_job(task_id, url, options, event_queue):
+    """创建在worker进程中执行的下载任务，每个事件附带任务的指标 (字节数, 速度, 阶段耗时)"""
+    def send(event, payload=None):
+        event_queue.put((task_id, event, payload, job.pop_stats()))
+
+    job = DownloadJob(
+        url, options,
+        on_progress=lambda record: send('progress', tuple(record)),
+        on_complete=lambda info: send('complete', _result_payload(info)),
+        on_error=lambda error: send('error', error),
+        on_cancelled=lambda: send('cancelled')
+    )
+    job.add_transfer_callback(lambda: send('transferred'))
+    return job
+
+
+def _worker_main(index, job_queue, event_queue, control_queue):
+    """worker进程入口：从共享队列中取任务，在本进程中下载并回报事件"""
+    current = {}
+
+    def control_loop():
+        while True:
+            message = control_queue.get()
+            if message is None:
+                return
+            command, value = message
+            if command == 'cancel' and value in current:
+                current[value].cancel()
+            elif command == 'bandwidth':
+                bandwidth_manager.set_limit(value)
+
+    threading.Thread(target=control_loop, daemon=True).start()
+
+    while True:
+        item = job_queue.get()
+        if item is None:
+            break
+        task_id, url, options = item
+        event_queue.put((task_id, 'started', index, None))
+
+        job = _create_job(task_id, url, options, event_queue)
+        current[task_id] = job
+        # 启用后处理进程池时，传输结束后即返回，继续取下一个任务
+        job.run()
+        current.pop(task_id, None)
+
+
+class RemoteJob(JobHandle):
+    """在worker进程中执行的下载任务在API进程中的句柄"""
+
+    def __init__(self, pool, task_id, **callbacks):
+        super().__init__(**callbacks)
+        self.pool = pool
+        self.task_id = task_id
+
+    def cancel(self):
+        super().cancel()
+        self.pool.cancel(self.task_id)
+
+
+class ProcessWorkerPool:
+    """多进程下载worker池
+
+    worker进程从共享的本地任务队列中取任务，进度和结果通过事件队列回传给API进程，
+    yt-dlp的信息提取和回调处理不再与API的事件循环争用同一个GIL。
+    """
+
+    def __init__(self, processes=2):
+        self.processes = processes
+        self._context = multiprocessing.get_context('spawn')
+        self._job_queue = None
+        self._event_queue = None
+        self._control_queues = []
+        self._workers = []
+        self._jobs = {}
+        self._assigned = {}
+        # 还未被worker取走时收到的取消请求，任务开始后再发给worker
+        self._pending_cancels = set()
+        # 任务的带宽权重和正在传输的任务，总带宽按此在worker进程之间分配
+        self._weights = {}
+        self._transferring = set()
+        self._sent_limits = {}
+        self._reader = None
+        self._last_bytes = {}
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._watched = 0.0
+        self.bandwidth_limit = None
+
+    def start(self):
+        self._job_queue = self._context.Queue()
+        self._event_queue = self._context.Queue()
+        for index in range(self.processes):
+            self._control_queues.append(None)
+            self._workers.append(None)
+            self._start_worker(index)
+        self._rebalance_bandwidth()
+
+        self._reader = threading.Thread(target=self._read_events, daemon=True)
+        self._reader.start()
+
+    def _start_worker(self, index):
+        control_queue = self._context.Queue()
+        worker = self._context.Process(
+            target=_worker_main,
+            args=(index, self._job_queue, self._event_queue, control_queue),
+            name=f"download-worker-{index}"
+        )
+        worker.start()
+        self._control_queues[index] = control_queue
+        self._workers[index] = worker
+        self._sent_limits.pop(index, None)
+
+    def _watch_workers(self):
+        """worker进程异常退出(崩溃、被系统杀死)时，其上的任务不会再有结束事件：
+        把这些任务标记为失败以释放调度槽位，并启动新的进程替代"""
+        now = time.monotonic()
+        if self._stopping or now - self._watched < WATCH_INTERVAL:
+            return
+        self._watched = now
+        for index, worker in enumerate(self._workers):
+            if worker.is_alive():
+                continue
+            print(f"下载进程 {worker.name} 异常退出(退出码 {worker.exitcode})，正在重启")
+            with self._lock:
+                lost = [task_id for task_id, assigned in self._assigned.items() if assigned == index]
+            for task_id in lost:
+                with self._lock:
+                    job = self._jobs.get(task_id)
+                if job is not None:
+                    self._end_job(task_id, job, 'error', f"下载进程异常退出(退出码 {worker.exitcode})")
+            self._start_worker(index)
+            self._rebalance_bandwidth()
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        for _ in self._workers:
+            self._job_queue.put(None)
+        for control_queue in self._control_queues:
+            control_queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self._event_queue.put(None)
+        self._workers = []
+        self._control_queues = []
+
+    def submit(self, task_id, url, options, **callbacks):
+        """提交任务到共享队列，返回可取消、可等待的任务句柄"""
+        job = RemoteJob(self, task_id, **callbacks)
+        with self._lock:
+            self._jobs[task_id] = job
+            self._weights[task_id] = max(options.get('bandwidth_weight', 1.0), 0.01)
+        self._job_queue.put((task_id, url, options))
+        return job
+
+    def cancel(self, task_id):
+        with self._lock:
+            index = self._assigned.get(task_id)
+            if index is None:
+                if task_id in self._jobs:
+                    self._pending_cancels.add(task_id)
+                return
+        self._control_queues[index].put(('cancel', task_id))
+
+    def set_bandwidth_limit(self, limit):
+        """设置所有worker进程共享的总带宽上限"""
+        self.bandwidth_limit = limit
+        self._rebalance_bandwidth()
+
+    def _rebalance_bandwidth(self):
+        """按各worker进程中正在传输的任务的权重分配总带宽
+
+        没有传输任务的worker按再多一个权重为1的任务预留份额，开始下载时不会被卡住，
+        收到开始事件后随即重新分配；它空闲时不占用带宽，实际总和不超过上限。
+        """
+        with self._lock:
+            if not self._control_queues:
+                return
+            limits = {}
+            if self.bandwidth_limit:
+                weights = [0.0] * len(self._control_queues)
+                for task_id in self._transferring:
+                    weights[self._assigned[task_id]] += self._weights.get(task_id, 1.0)
+                total = sum(weights)
+                for index, weight in enumerate(weights):
+                    share = weight / total if weight else 1.0 / (total + 1.0)
+                    limits[index] = max(int(self.bandwidth_limit * share), 1)
+            else:
+                limits = dict.fromkeys(range(len(self._control_queues)))
+            changed = {index: limit for index, limit in limits.items()
+                       if self._sent_limits.get(index, -1) != limit}
+            self._sent_limits.update(changed)
+            control_queues = list(self._control_queues)
+        for index, limit in changed.items():
+            control_queues[index].put(('bandwidth', limit))
+
+    def _read_events(self):
+        while True:
+            self._watch_workers()
+            try:
+                message = self._event_queue.get(timeout=WATCH_INTERVAL)
+            except queue.Empty:
+                continue
+            if message is None:
+                return
+            task_id, event, payload, stats = message
+            with self._lock:
+                job = self._jobs.get(task_id)
+            if job is None:
+                continue
+            if stats is not None:
+                self._record_stats(task_id, *stats)
+
+            if event == 'started':
+                with self._lock:
+                    self._assigned[task_id] = payload
+                    cancelled = task_id in self._pending_cancels or job.is_cancelled
+                    self._pending_cancels.discard(task_id)
+                    self._transferring.add(task_id)
+                if cancelled:
+                    # 排队期间已被取消的任务，开始后立即通知worker取消
+                    self.cancel(task_id)
+                self._rebalance_bandwidth()
+            elif event == 'transferred':
+                with self._lock:
+                    self._transferring.discard(task_id)
+                self._rebalance_bandwidth()
+                job._transfer_done()
+            elif event == 'progress':
+                job._emit(job.on_progress, ProgressRecord(*payload))
+            else:
+                self._end_job(task_id, job, event, payload)
+
+    def _end_job(self, task_id, job, event, payload):
+        """报告任务的结束事件('complete'/'error'/'cancelled')"""
+        with self._lock:
+            # 已结束的任务(如进程退出后才读到的事件)不再重复报告
+            if self._jobs.pop(task_id, None) is None:
+                return
+            self._assigned.pop(task_id, None)
+            self._pending_cancels.discard(task_id)
+            self._transferring.discard(task_id)
+            self._weights.pop(task_id, None)
+            self._last_bytes.pop(task_id, None)
+        set_speed((id(self), task_id), None)
+        self._rebalance_bandwidth()
+        if event == 'complete':
+            metrics.downloads_total.inc(status='completed')
+            job._emit(job.on_complete, payload)
+        elif event == 'error':
+            metrics.downloads_total.inc(status='error')
+            metrics.download_errors_total.inc(cause=metrics.classify_error(Exception(payload)))
+            job._emit(job.on_error, payload)
+        else:
+            metrics.downloads_total.inc(status='cancelled')
+            job._emit(job.on_cancelled)
+        job._finish()
+
+    def _record_stats(self, task_id, transferred, speed, timings):
+        """worker进程中的指标不会汇总到API进程，这里根据worker随事件回传的数据统计"""
+        with self._lock:
+            last = self._last_bytes.get(task_id, 0)
+            self._last_bytes[task_id] = transferred
+        if transferred > last:
+            metrics.downloaded_bytes_total.inc(transferred - last)
+        set_speed((id(self), task_id), speed or None)
+        for name, elapsed, labels in timings:
+            _HISTOGRAMS[name].observe(elapsed, **labels)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import namedtuple
+
+
+class ProgressRecord(namedtuple('ProgressRecord', ['downloaded', 'total', 'speed', 'eta'])):
+    """固定结构的下载进度
+
+    downloaded: 已下载字节数
+    total: 总字节数(未知时为None，可能是估计值)
+    speed: 下载速度(字节/秒)，未知时为None
+    eta: 预计剩余秒数，未知时为None
+    """
+    __slots__ = ()
+
+    @property
+    def percent(self):
+        """下载百分比，总大小未知时为None"""
+        if not self.total:
+            return None
+        return min(int(self.downloaded * 100 / self.total), 100)
+
+
+def make_record(progress):
+    """从yt-dlp的进度字典中取出需要的字段"""
+    return ProgressRecord(
+        downloaded=progress.get('downloaded_bytes') or 0,
+        total=progress.get('total_bytes') or progress.get('total_bytes_estimate') or None,
+        speed=progress.get('speed'),
+        eta=progress.get('eta'),
+    )
+
+
+def combine_records(records):
+    """把同时下载的多个文件的进度合并为一个，尚未开始的文件记为None"""
+    started = [record for record in records if record is not None]
+    downloaded = sum(record.downloaded for record in started)
+    totals = [record.total for record in records if record is not None and record.total]
+    # 任何一个文件的总大小未知时，合并后的总大小也未知
+    total = sum(totals) if len(totals) == len(records) else None
+    speed = sum(record.speed for record in started if record.speed) or None
+    eta = int((total - downloaded) / speed) if total and speed else None
+    return ProgressRecord(downloaded, total, speed, eta)
+
+
+class ProgressAggregator:
+    """按固定频率采样下载进度
+
+    yt-dlp每下载一个数据块就调用一次进度回调，高速下载时每秒可达上千次。
+    聚合器只在距上次发送超过采样间隔时才把最新进度交给回调，
+    文件下载完成时立即发送最终进度，保证进度条能到达100%。
+    同时下载多个文件(如视频流和音频流)时，可以用 begin_group() 把它们合并为一个进度。
+    """
+
+    def __init__(self, callback, rate=10.0):
+        """
+        Args:
+            callback: 接收 ProgressRecord 的回调
+            rate: 每秒最多发送的次数，None或0表示不限制
+        """
+        self.callback = callback
+        self.interval = 1.0 / rate if rate else 0.0
+        self._last_sent = 0.0
+        self._group = None
+        self._group_done = set()
+        self._reported = set()
+        self._lock = threading.Lock()
+
+    def begin_group(self, filenames):
+        """之后这些文件的进度合并报告，全部完成时才发送最终进度"""
+        with self._lock:
+            self._group = {filename: None for filename in filenames}
+            self._group_done = set()
+
+    def end_group(self):
+        with self._lock:
+            # 这些文件的完成进度已经合并报告过，yt-dlp之后发现文件已存在时不再单独报告
+            self._reported = set(self._group_done)
+            self._group = None
+
+    def update(self, progress):
+        """处理一次yt-dlp进度回调(可能来自多个下载线程)，返回是否发送了进度"""
+        status = progress.get('status')
+        if status not in ('downloading', 'finished'):
+            return False
+        record = make_record(progress)
+        finished = status == 'finished'
+        if finished:
+            total = record.total or record.downloaded or None
+            record = record._replace(downloaded=total or 0, total=total, eta=0)
+
+        with self._lock:
+            filename = progress.get('filename')
+            if finished and filename in self._reported:
+                return False
+            if self._group is not None and filename in self._group:
+                self._group[filename] = record
+                if finished:
+                    self._group_done.add(filename)
+                record = combine_records(list(self._group.values()))
+                finished = len(self._group_done) == len(self._group)
+
+            now = time.monotonic()
+            if not finished and now - self._last_sent < self.interval:
+                return False
+            self._last_sent = now
+        self._send(record)
+        return True
+
+    def _send(self, record):
+        if self.callback:
+            self.callback(record)
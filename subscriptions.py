@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import yt_dlp
+from yt_dlp.utils import PagedList
+
+from batch import MAX_NESTING, extract_options, playlist_entry_url
+from utils import serializable_options
+
+# 增量同步时连续遇到这么多个已知条目即停止翻页，容忍个别视频被删除或顺序调整
+STOP_AFTER_KNOWN = 3
+# 分页列表每次取的条目数
+PAGE_SIZE = 100
+
+
+def is_newest_first(url):
+    """频道的视频列表按发布时间从新到旧排列，可以在遇到已知条目时停止；
+    播放列表通常按添加顺序排列，新视频在末尾，只能完整翻页"""
+    return 'list=' not in url
+
+
+def _iter_entries(entries):
+    """逐页迭代平铺提取的条目，只在需要时才请求下一页"""
+    if isinstance(entries, PagedList):
+        start = 0
+        while True:
+            page = entries.getslice(start, start + PAGE_SIZE)
+            if not page:
+                return
+            yield from page
+            start += len(page)
+    else:
+        yield from entries or []
+
+
+def iter_playlist(ydl, url, is_known=None, stop_after=0):
+    """惰性展开播放列表或频道
+
+    Args:
+        is_known: 判断条目是否已知的函数，给出时只产出未知的条目
+        stop_after: 同一列表中连续遇到这么多个已知条目时不再翻页该列表，继续下一个列表
+            (如频道的下一个标签页)；0表示不提前停止
+
+    Returns:
+        (列表标题, 条目生成器)；URL不是播放列表时返回 (None, None)
+    """
+    result = ydl.extract_info(url, download=False, process=False)
+    # 频道首页等URL会先重定向到实际的列表
+    depth = 0
+    while result.get('_type') in ('url', 'url_transparent') and depth < MAX_NESTING:
+        result = ydl.extract_info(result['url'], download=False, process=False)
+        depth += 1
+    if result.get('_type') != 'playlist':
+        return None, None
+
+    def generate(playlist, depth):
+        known_run = 0
+        for entry in _iter_entries(playlist.get('entries')):
+            if not entry:
+                continue
+            entry_url = playlist_entry_url(entry)
+            if entry.get('_type') == 'playlist':
+                yield from generate(entry, depth + 1)
+            elif entry.get('ie_key') == 'YoutubeTab' and depth < MAX_NESTING:
+                # 频道的标签页本身也是播放列表
+                nested = ydl.extract_info(entry_url, download=False, process=False)
+                yield from generate(nested, depth + 1)
+            elif entry_url and entry.get('id'):
+                item = {
+                    'url': entry_url,
+                    'id': entry['id'],
+                    'title': entry.get('title') or entry_url,
+                    'upload_date': entry.get('upload_date'),
+                }
+                if is_known is None or not is_known(item):
+                    known_run = 0
+                    yield item
+                    continue
+                known_run += 1
+                if stop_after and known_run >= stop_after:
+                    return
+
+    return result.get('title') or url, generate(result, 0)
+
+
+class SubscriptionStore:
+    """频道和播放列表订阅
+
+    为每个订阅保存已见过的条目ID和发布日期。同步时从最新的条目开始翻页，
+    遇到已知条目即停止，只把新视频加入下载；没有更新的频道同步只需请求第一页。
+    新条目在调用方加入下载队列后由 commit() 记录为已见过，加入失败时下次同步仍会找到它们。
+    """
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.expanduser("~/youtube_downloader_subscriptions.db")
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # 同一订阅同时只进行一次同步，避免重复加入新视频
+        self._sync_locks = defaultdict(threading.Lock)
+        # 已由同步返回、还未 commit() 的条目ID，再次同步时视为已知
+        self._pending = defaultdict(set)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS subscriptions (
+                    id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL UNIQUE,
+                    title TEXT,
+                    format TEXT,
+                    output_dir TEXT,
+                    options TEXT NOT NULL,
+                    newest_first INTEGER NOT NULL,
+                    download_existing INTEGER NOT NULL DEFAULT 0,
+                    latest_upload_date TEXT,
+                    entry_count INTEGER NOT NULL DEFAULT 0,
+                    last_synced_at REAL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS seen_entries (
+                    subscription_id TEXT NOT NULL,
+                    entry_id TEXT NOT NULL,
+                    upload_date TEXT,
+                    seen_at REAL NOT NULL,
+                    PRIMARY KEY (subscription_id, entry_id)
+                ) WITHOUT ROWID
+            """)
+
+    @staticmethod
+    def _to_dict(row):
+        subscription = dict(row)
+        subscription['options'] = json.loads(subscription['options'])
+        subscription['newest_first'] = bool(subscription['newest_first'])
+        subscription['download_existing'] = bool(subscription['download_existing'])
+        return subscription
+
+    def add(self, url, options=None, format=None, output_dir=None, download_existing=False):
+        """添加订阅，URL已订阅时更新下载设置并返回原订阅
+
+        Args:
+            download_existing: 第一次同步时是否下载已有的视频，否则只记录为已见过
+        """
+        options_json = json.dumps(serializable_options(options or {}), ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO subscriptions (id, url, format, output_dir, options, newest_first, "
+                "download_existing, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET format = excluded.format, "
+                "output_dir = excluded.output_dir, options = excluded.options",
+                (f"sub_{uuid.uuid4().hex}", url, format, output_dir, options_json,
+                 int(is_newest_first(url)), int(download_existing), time.time()))
+            row = self._conn.execute("SELECT * FROM subscriptions WHERE url = ?", (url,)).fetchone()
+        return self._to_dict(row)
+
+    def remove(self, subscription_id):
+        """删除订阅及其已见过的条目，返回是否存在"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM seen_entries WHERE subscription_id = ?", (subscription_id,))
+            cursor = self._conn.execute("DELETE FROM subscriptions WHERE id = ?", (subscription_id,))
+        return cursor.rowcount > 0
+
+    def get(self, subscription_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM subscriptions WHERE id = ?", (subscription_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM subscriptions ORDER BY created_at").fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def seen_ids(self, subscription_id):
+        """订阅中所有已见过的条目ID"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT entry_id FROM seen_entries WHERE subscription_id = ?", (subscription_id,))
+            return {row[0] for row in rows}
+
+    def mark_seen(self, subscription_id, entries, title=None):
+        """记录已见过的条目，并更新订阅的同步时间和最新发布日期"""
+        now = time.time()
+        dates = [entry['upload_date'] for entry in entries if entry.get('upload_date')]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen_entries (subscription_id, entry_id, upload_date, seen_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(subscription_id, entry['id'], entry.get('upload_date'), now) for entry in entries])
+            self._conn.execute(
+                "UPDATE subscriptions SET title = COALESCE(?, title), last_synced_at = ?, "
+                "latest_upload_date = MAX(COALESCE(latest_upload_date, ''), ?), "
+                "entry_count = (SELECT COUNT(*) FROM seen_entries WHERE subscription_id = ?) "
+                "WHERE id = ?",
+                (title, now, max(dates, default=''), subscription_id, subscription_id))
+
+    def sync(self, subscription_id):
+        """增量同步一个订阅
+
+        从最新的条目开始翻页，连续遇到 STOP_AFTER_KNOWN 个已知条目(或发布日期早于已记录的
+        最新发布日期的条目)时停止，频道的各个标签页分别判断。
+        调用方把新条目加入下载后调用 commit() 记录为已见过，无法加入时调用 release()。
+
+        Returns:
+            {'title', 'entries': 需要下载的新条目(按发布顺序从旧到新),
+             'discovered': 所有新条目(第一次同步不下载已有视频时 entries 为空),
+             'scanned': 检查的条目数, 'elapsed': 耗时秒数}；订阅不存在时返回None
+        """
+        with self._lock:
+            sync_lock = self._sync_locks[subscription_id]
+        with sync_lock:
+            return self._sync(subscription_id)
+
+    def _sync(self, subscription_id):
+        subscription = self.get(subscription_id)
+        if subscription is None:
+            return None
+        started = time.monotonic()
+        seen = self.seen_ids(subscription_id)
+        with self._lock:
+            seen |= self._pending[subscription_id]
+        first_sync = subscription['last_synced_at'] is None
+        cursor_date = subscription['latest_upload_date']
+        stop_early = subscription['newest_first'] and not first_sync
+
+        new_entries = []
+        scanned = 0
+
+        def is_known(entry):
+            nonlocal scanned
+            scanned += 1
+            return entry['id'] in seen or bool(
+                stop_early and cursor_date and entry['upload_date'] and entry['upload_date'] < cursor_date)
+
+        flat_opts = dict(extract_options(subscription['options']), extract_flat='in_playlist')
+        with yt_dlp.YoutubeDL(flat_opts) as ydl:
+            # 频道首页展开为视频、短视频、直播等多个标签页，每个标签页分别判断是否停止
+            title, entries = iter_playlist(ydl, subscription['url'], is_known,
+                                           STOP_AFTER_KNOWN if stop_early else 0)
+            if entries is None:
+                raise Exception("URL不是播放列表或频道")
+            for entry in entries:
+                seen.add(entry['id'])
+                new_entries.append(entry)
+
+        with self._lock:
+            self._pending[subscription_id].update(entry['id'] for entry in new_entries)
+        if subscription['newest_first']:
+            new_entries.reverse()
+        return {
+            'title': title,
+            'entries': [] if first_sync and not subscription['download_existing'] else new_entries,
+            'discovered': new_entries,
+            'scanned': scanned,
+            'elapsed': time.monotonic() - started,
+        }
+
+    def commit(self, subscription_id, result):
+        """同步结果中的新条目已加入下载，记录为已见过"""
+        self.mark_seen(subscription_id, result['discovered'], result['title'])
+        self.release(subscription_id, result)
+
+    def release(self, subscription_id, result):
+        """新条目未能加入下载，下次同步时重新发现它们"""
+        with self._lock:
+            self._pending[subscription_id].difference_update(
+                entry['id'] for entry in result['discovered'])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_subscriptions():
+    """获取进程内共享的订阅存储，首次使用时才打开数据库"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SubscriptionStore()
+        return _store
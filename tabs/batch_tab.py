@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit,
+                            QLabel, QSpinBox, QTableWidget, QTableWidgetItem, QHeaderView,
+                            QProgressBar, QMessageBox, QCheckBox)
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from batch import expand_playlist
+from download import YouTubeDownloader
+from download_thread import BatchDownloadThread
+from subscriptions import get_subscriptions
+
+
+def sync_subscriptions(subscription_ids, workers=4):
+    """并行同步订阅，返回 expand_playlist 形式的新视频列表，每个条目带有所属订阅的下载选项
+
+    批量下载线程接收条目后调用列表的 on_queued(True)，新视频此时才记录为已见过。
+    """
+    store = get_subscriptions()
+
+    def sync(subscription_id):
+        try:
+            return store.get(subscription_id), store.sync(subscription_id)
+        except Exception as e:
+            # 单个订阅同步失败不影响其他订阅
+            print(f"同步订阅失败: {subscription_id}: {str(e)}")
+            return None, None
+
+    entries = []
+    synced = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for subscription, result in executor.map(sync, subscription_ids):
+            if result:
+                synced.append((subscription['id'], result))
+            if not result or not result['entries']:
+                continue
+            options = dict(subscription['options'])
+            # 日志对象无法持久化，按订阅的输出目录重新配置
+            download_path = subscription['output_dir'] or os.path.dirname(options.get('outtmpl') or '')
+            if download_path:
+                options.update(YouTubeDownloader.configure_logging(download_path))
+            entries.extend(dict(entry, options=options) for entry in result['entries'])
+
+    def on_queued(queued):
+        for subscription_id, result in synced:
+            if queued:
+                store.commit(subscription_id, result)
+            else:
+                store.release(subscription_id, result)
+
+    return {'title': "订阅更新", 'entries': entries, 'on_queued': on_queued}
+
+
+class BatchTab(QWidget):
+    """播放列表和频道的批量下载，格式、保存位置和其他设置与单个视频下载相同"""
+
+    def __init__(self, main_window):
+        super().__init__()
+        self.main_window = main_window
+        self.batch_thread = None
+        self.format_option = None
+        self.initUI()
+
+    def initUI(self):
+        batch_layout = QVBoxLayout(self)
+
+        # URL输入区域
+        url_layout = QHBoxLayout()
+        self.url_input = QLineEdit()
+        self.url_input.setPlaceholderText("输入播放列表或频道URL...")
+        url_layout.addWidget(self.url_input)
+
+        url_layout.addWidget(QLabel("同时下载:"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 8)
+        self.workers_spin.setValue(3)
+        url_layout.addWidget(self.workers_spin)
+
+        self.skip_archived_check = QCheckBox("跳过已下载的视频")
+        self.skip_archived_check.setChecked(True)
+        url_layout.addWidget(self.skip_archived_check)
+
+        self.start_btn = QPushButton("下载全部")
+        self.start_btn.clicked.connect(self.start_batch)
+        url_layout.addWidget(self.start_btn)
+
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.clicked.connect(self.cancel_batch)
+        self.cancel_btn.setEnabled(False)
+        url_layout.addWidget(self.cancel_btn)
+
+        batch_layout.addLayout(url_layout)
+
+        # 订阅：记录频道已有的视频，之后每次同步只下载新视频
+        subscription_layout = QHBoxLayout()
+        self.subscription_label = QLabel()
+        subscription_layout.addWidget(self.subscription_label)
+
+        self.subscribe_btn = QPushButton("订阅")
+        self.subscribe_btn.clicked.connect(self.subscribe)
+        subscription_layout.addWidget(self.subscribe_btn)
+
+        self.sync_btn = QPushButton("同步订阅")
+        self.sync_btn.clicked.connect(self.sync_all)
+        subscription_layout.addWidget(self.sync_btn)
+
+        batch_layout.addLayout(subscription_layout)
+
+        # 条目列表
+        self.entry_table = QTableWidget(0, 3)
+        self.entry_table.setHorizontalHeaderLabels(["标题", "状态", "进度"])
+        self.entry_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)  # 标题列自适应
+        self.entry_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.entry_table.setColumnWidth(1, 160)  # 状态列
+        self.entry_table.setColumnWidth(2, 120)  # 进度列
+        batch_layout.addWidget(self.entry_table)
+
+        # 整体进度
+        self.batch_progress = QProgressBar()
+        self.batch_progress.setValue(0)
+        batch_layout.addWidget(self.batch_progress)
+
+        self.summary_label = QLabel("准备就绪")
+        batch_layout.addWidget(self.summary_label)
+
+        self.update_subscription_label()
+
+    def update_subscription_label(self):
+        try:
+            count = len(get_subscriptions().list())
+        except Exception as e:
+            print(f"读取订阅失败: {str(e)}")
+            count = 0
+        self.subscription_label.setText(f"已订阅 {count} 个频道或播放列表")
+
+    def _prepare_options(self):
+        """按主窗口的格式和保存位置准备下载选项，返回 (url, 下载目录, 下载选项)，无法开始时返回None"""
+        url = self.url_input.text().strip()
+        if not url:
+            QMessageBox.warning(self, "错误", "请输入有效的URL")
+            return None
+
+        download_path = self.main_window.ensure_download_path()
+        if download_path is None:
+            return None
+
+        self.format_option = self.main_window.format_combo.currentText()
+        ydl_opts = self.main_window.build_download_options(url, self.format_option, download_path)
+        if ydl_opts is None:
+            return None  # 用户取消了操作
+        return url, download_path, ydl_opts
+
+    def start_batch(self):
+        prepared = self._prepare_options()
+        if prepared is not None:
+            url, _, ydl_opts = prepared
+            self.run_batch(url, ydl_opts)
+
+    def subscribe(self):
+        prepared = self._prepare_options()
+        if prepared is None:
+            return
+        url, download_path, ydl_opts = prepared
+        reply = QMessageBox.question(
+            self, "订阅",
+            "是否下载频道中已有的视频？选择“否”则只下载以后发布的新视频。",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        download_existing = reply == QMessageBox.StandardButton.Yes
+        subscription = get_subscriptions().add(
+            url, ydl_opts, self.format_option, download_path, download_existing)
+        self.update_subscription_label()
+        # 立即进行第一次同步
+        self.run_batch(url, ydl_opts,
+                       expand=lambda url, options: sync_subscriptions([subscription['id']]))
+
+    def sync_all(self):
+        subscription_ids = [subscription['id'] for subscription in get_subscriptions().list()]
+        if not subscription_ids:
+            QMessageBox.information(self, "同步订阅", "还没有订阅任何频道或播放列表")
+            return
+        self.format_option = self.main_window.format_combo.currentText()
+        self.run_batch("", {},
+                       expand=lambda url, options: sync_subscriptions(subscription_ids))
+
+    def run_batch(self, url, ydl_opts, expand=None):
+        self.entry_table.setRowCount(0)
+        self.batch_progress.setValue(0)
+
+        self.batch_thread = BatchDownloadThread(
+            url, ydl_opts, workers=self.workers_spin.value(), expand=expand or expand_playlist,
+            skip_archived=self.skip_archived_check.isChecked())
+        self.batch_thread.entries_signal.connect(self.show_entries)
+        self.batch_thread.entry_progress_signal.connect(self.update_entry_progress)
+        self.batch_thread.entry_status_signal.connect(self.update_entry_status)
+        self.batch_thread.entry_complete_signal.connect(self.entry_complete)
+        self.batch_thread.batch_status_signal.connect(self.update_batch_status)
+        self.batch_thread.error_signal.connect(self.batch_error)
+        self.batch_thread.finished.connect(self.batch_finished)
+
+        self._set_running(True)
+        self.batch_thread.start()
+
+    def show_entries(self, title, entries):
+        self.summary_label.setText(f"{title}: 共 {len(entries)} 个视频")
+        self.entry_table.setRowCount(len(entries))
+        for row, entry in enumerate(entries):
+            self.entry_table.setItem(row, 0, QTableWidgetItem(entry['title']))
+            self.entry_table.setItem(row, 1, QTableWidgetItem("等待中"))
+            self.entry_table.setItem(row, 2, QTableWidgetItem(""))
+
+    def update_entry_progress(self, index, record):
+        """显示条目的下载进度，record 为按固定频率采样的 ProgressRecord"""
+        item = self.entry_table.item(index, 2)
+        if item is None:
+            return
+        text = f"{record.percent}%" if record.total else f"{record.downloaded // (1024 * 1024)} MB"
+        # 文本未变化时不触发重绘
+        if item.text() != text:
+            item.setText(text)
+
+    def update_entry_status(self, index, status):
+        if index < 0:
+            self.summary_label.setText(status)
+            return
+        item = self.entry_table.item(index, 1)
+        if item is not None:
+            item.setText(status)
+            item.setToolTip(status)
+
+    def entry_complete(self, index, info):
+        item = self.entry_table.item(index, 2)
+        if item is not None:
+            item.setText("100%")
+        # 订阅的条目使用订阅时保存的格式，不一定是当前选择的格式
+        entry = self.batch_thread.entries[index]
+        options = entry.get('options') or self.batch_thread.options
+        self.main_window.record_history(info, options.get('archive_profile') or self.format_option)
+
+    def update_batch_status(self, completed, failed, total):
+        if total:
+            self.batch_progress.setValue(int((completed + failed) * 100 / total))
+        self.summary_label.setText(f"已完成 {completed}/{total}，失败 {failed}")
+
+    def batch_error(self, error_msg):
+        self.summary_label.setText(error_msg)
+        QMessageBox.critical(self, "错误", error_msg)
+
+    def batch_finished(self):
+        self._set_running(False)
+        self.update_subscription_label()
+
+    def _set_running(self, running):
+        self.start_btn.setEnabled(not running)
+        self.subscribe_btn.setEnabled(not running)
+        self.sync_btn.setEnabled(not running)
+        self.cancel_btn.setEnabled(running)
+
+    def cancel_batch(self):
+        if self.batch_thread and self.batch_thread.isRunning():
+            self.batch_thread.cancel()
+            self.summary_label.setText("正在取消...")
+            self.cancel_btn.setEnabled(False)
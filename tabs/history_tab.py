@@ -1,37 +1,73 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                            QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog,
-                            QMessageBox)
-from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog,
+                            QMessageBox, QLineEdit, QLabel, QCheckBox, QDateEdit, QProgressBar)
+from PyQt6.QtCore import Qt, QDate, QTimer
 import os
 from datetime import datetime
 
+from download_thread import HistoryExportThread
+from history_export import EXPORT_FORMATS
+from history_model import HistoryModel, create_history_view
+
+# 输入搜索关键词后等待这么久(毫秒)再查询
+SEARCH_DELAY = 250
+
 class HistoryTab(QWidget):
     def __init__(self, main_window):
         super().__init__()
         self.main_window = main_window
+        self.export_thread = None
         self.initUI()
         
     def initUI(self):
         # 历史记录标签页布局
         history_layout = QVBoxLayout(self)
         
-        # 创建历史记录表格
-        self.history_table = QTableWidget(0, 7)
-        self.history_table.setHorizontalHeaderLabels(["", "标题", "时长", "大小", "格式", "分辨率", "来源"])
-        self.history_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)  # 标题列自适应
-        self.history_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        # 搜索和筛选
+        filter_layout = QHBoxLayout()
+        
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("搜索标题、来源、URL或格式...")
+        self.search_input.setClearButtonEnabled(True)
+        filter_layout.addWidget(self.search_input)
+        
+        self.date_filter_check = QCheckBox("下载日期")
+        filter_layout.addWidget(self.date_filter_check)
+        
+        self.date_from_edit = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.date_from_edit.setCalendarPopup(True)
+        self.date_from_edit.setDisplayFormat("yyyy-MM-dd")
+        filter_layout.addWidget(self.date_from_edit)
         
-        # 设置列宽
-        self.history_table.setColumnWidth(0, 40)  # 图标列
-        self.history_table.setColumnWidth(2, 80)  # 时长列
-        self.history_table.setColumnWidth(3, 80)  # 大小列
-        self.history_table.setColumnWidth(4, 80)  # 格式列
-        self.history_table.setColumnWidth(5, 80)  # 分辨率列
-        self.history_table.setColumnWidth(6, 150)  # 来源列
+        filter_layout.addWidget(QLabel("至"))
         
+        self.date_to_edit = QDateEdit(QDate.currentDate())
+        self.date_to_edit.setCalendarPopup(True)
+        self.date_to_edit.setDisplayFormat("yyyy-MM-dd")
+        filter_layout.addWidget(self.date_to_edit)
+        
+        self.result_label = QLabel()
+        filter_layout.addWidget(self.result_label)
+        
+        history_layout.addLayout(filter_layout)
+        
+        # 停止输入后再查询，避免每输入一个字都查询一次
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.apply_filters)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.date_filter_check.toggled.connect(self.apply_filters)
+        self.date_from_edit.dateChanged.connect(self.apply_filters)
+        self.date_to_edit.dateChanged.connect(self.apply_filters)
+        
+        # 创建历史记录表格，使用独立的模型，搜索和排序不影响主窗口的下载列表
+        self.history_model = HistoryModel(self.main_window.history_manager, self)
+        self.history_table = create_history_view(self.history_model, self.play_history_item)
+        self.history_table.setSortingEnabled(True)
+        self.history_table.horizontalHeader().setSortIndicator(7, Qt.SortOrder.DescendingOrder)
         history_layout.addWidget(self.history_table)
         
         # 添加历史记录操作按钮
@@ -45,34 +81,31 @@ class HistoryTab(QWidget):
         self.export_history_btn.clicked.connect(self.export_history)
         history_buttons_layout.addWidget(self.export_history_btn)
         
+        self.export_progress = QProgressBar()
+        self.export_progress.setVisible(False)
+        history_buttons_layout.addWidget(self.export_progress)
+        
         history_layout.addLayout(history_buttons_layout)
         
-        # 填充历史记录表格
-        self.populate_history_table()
+        self.update_result_count()
     
-    def populate_history_table(self):
-        """根据下载历史填充表格"""
-        # 清空表格
-        self.history_table.setRowCount(0)
-        
-        # 添加历史记录
-        for item in self.main_window.download_history:
-            row = self.history_table.rowCount()
-            self.history_table.insertRow(row)
-            
-            # 添加播放图标
-            play_btn = QPushButton("▶")
-            play_btn.setMaximumWidth(30)
-            play_btn.clicked.connect(lambda checked, item=item: self.play_history_item(item))
-            self.history_table.setCellWidget(row, 0, play_btn)
-            
-            # 添加其他数据
-            self.history_table.setItem(row, 1, QTableWidgetItem(item.get('title', '未知')))
-            self.history_table.setItem(row, 2, QTableWidgetItem(item.get('duration', '--:--')))
-            self.history_table.setItem(row, 3, QTableWidgetItem(item.get('size', '未知')))
-            self.history_table.setItem(row, 4, QTableWidgetItem(item.get('format', '未知')))
-            self.history_table.setItem(row, 5, QTableWidgetItem(item.get('resolution', '未知')))
-            self.history_table.setItem(row, 6, QTableWidgetItem(item.get('uploader', '未知')))
+    def apply_filters(self):
+        """按搜索关键词和日期范围重新查询"""
+        date_from = date_to = None
+        if self.date_filter_check.isChecked():
+            date_from = self.date_from_edit.date().toString("yyyy-MM-dd")
+            # 包含结束日期当天
+            date_to = self.date_to_edit.date().addDays(1).toString("yyyy-MM-dd")
+        self.history_model.set_filters(self.search_input.text().strip(), date_from, date_to)
+        self.update_result_count()
+    
+    def update_result_count(self):
+        self.result_label.setText(f"共 {self.history_model.matching_count()} 条")
+    
+    def add_item(self, item):
+        """显示新完成的下载"""
+        self.history_model.prepend(item)
+        self.update_result_count()
     
     def play_history_item(self, item):
         """播放历史记录中的项目"""
@@ -94,18 +127,55 @@ class HistoryTab(QWidget):
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                                      QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            self.main_window.download_history = []
-            self.history_table.setRowCount(0)
-            self.main_window.save_history()
-            self.main_window.populate_example_data()
+            self.main_window.history_manager.clear()
+            self.main_window.history_model.reload()
+            self.history_model.reload()
+            self.update_result_count()
     
     def export_history(self):
-        """导出历史记录到文件"""
-        file_path, _ = QFileDialog.getSaveFileName(self, "导出历史记录", 
+        """在后台导出当前搜索和筛选条件下的历史记录，导出过程中再次点击则取消"""
+        if self.export_thread and self.export_thread.isRunning():
+            self.export_thread.cancel()
+            self.export_history_btn.setEnabled(False)
+            return
+        
+        name_filters = [f"{name}文件 (*{extension})" for extension, (name, _) in EXPORT_FORMATS.items()]
+        file_path, selected_filter = QFileDialog.getSaveFileName(self, "导出历史记录", 
                                                   os.path.expanduser("~/Downloads/youtube_history.csv"),
-                                                  "CSV文件 (*.csv)")
-        if file_path:
-            if self.main_window.history_manager.export_history_to_csv(file_path, self.main_window.download_history):
-                QMessageBox.information(self, "导出成功", f"历史记录已导出到: {file_path}")
-            else:
-                QMessageBox.critical(self, "导出失败", "导出历史记录时出错")
\ No newline at end of file
+                                                  ";;".join(name_filters))
+        if not file_path:
+            return
+        # 没有输入扩展名时按选择的文件类型补上
+        if os.path.splitext(file_path)[1].lower() not in EXPORT_FORMATS:
+            extensions = list(EXPORT_FORMATS)
+            index = name_filters.index(selected_filter) if selected_filter in name_filters else 0
+            file_path += extensions[index]
+        
+        self.export_thread = HistoryExportThread(
+            self, self.main_window.history_manager, file_path, self.history_model.filters())
+        self.export_thread.progress_signal.connect(self.update_export_progress)
+        self.export_thread.finished_signal.connect(
+            lambda exported: self.export_finished(file_path, exported))
+        self.export_thread.error_signal.connect(self.export_error)
+        self.export_thread.finished.connect(self.reset_export_ui)
+        
+        self.export_progress.setValue(0)
+        self.export_progress.setVisible(True)
+        self.export_history_btn.setText("取消导出")
+        self.export_thread.start()
+    
+    def update_export_progress(self, exported, total):
+        if total:
+            self.export_progress.setValue(min(100, exported * 100 // total))
+    
+    def export_finished(self, file_path, exported):
+        if exported is not None:
+            QMessageBox.information(self, "导出成功", f"已导出 {exported} 条历史记录到: {file_path}")
+    
+    def export_error(self, error_msg):
+        QMessageBox.critical(self, "导出失败", error_msg)
+    
+    def reset_export_ui(self):
+        self.export_progress.setVisible(False)
+        self.export_history_btn.setText("导出历史")
+        self.export_history_btn.setEnabled(True)
\ No newline at end of file
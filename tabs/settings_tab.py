@@ -2,9 +2,14 @@
 # -*- coding: utf-8 -*-
 
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGroupBox, QFormLayout, 
-                            QCheckBox, QLineEdit, QLabel, QComboBox)
+                            QCheckBox, QLineEdit, QLabel, QComboBox, QMessageBox, QSpinBox)
 from PyQt6.QtCore import Qt
 
+from bandwidth import bandwidth_manager
+from my_logger import LOG_LEVEL, set_log_level
+from turbo import DEFAULT_MAX_FRAGMENTS
+from utils import parse_size
+
 class SettingsTab(QWidget):
     def __init__(self, main_window):
         super().__init__()
@@ -86,12 +91,80 @@ class SettingsTab(QWidget):
         
         self.limit_check.toggled.connect(lambda checked: self.limit_input.setEnabled(checked))
         
+        # 所有下载共享的总带宽上限，修改后立即对进行中的下载生效
+        self.bandwidth_check = QCheckBox("限制总带宽(所有下载共享)")
+        other_layout.addRow("", self.bandwidth_check)
+        
+        self.bandwidth_input = QLineEdit()
+        self.bandwidth_input.setPlaceholderText("10M")
+        self.bandwidth_input.setEnabled(False)
+        other_layout.addRow("总带宽:", self.bandwidth_input)
+        
+        self.bandwidth_check.toggled.connect(lambda checked: self.bandwidth_input.setEnabled(checked))
+        self.bandwidth_check.toggled.connect(self.apply_bandwidth_limit)
+        self.bandwidth_input.editingFinished.connect(self.apply_bandwidth_limit)
+        
+        # 合并格式(最佳质量、1080p等)的视频流和音频流同时下载，都完成后再合并
+        self.parallel_streams_check = QCheckBox("同时下载视频流和音频流")
+        self.parallel_streams_check.setChecked(True)
+        other_layout.addRow("", self.parallel_streams_check)
+        
+        # 加速模式：并行下载分片，并发数和分块大小在上限内根据实测吞吐量自动调节
+        self.turbo_check = QCheckBox("加速模式(并行下载分片)")
+        self.turbo_check.setToolTip("根据实测下载速度自动调节并发分片数和分块大小，适合高延迟网络")
+        other_layout.addRow("", self.turbo_check)
+        
+        self.turbo_fragments_spin = QSpinBox()
+        self.turbo_fragments_spin.setRange(1, 64)
+        self.turbo_fragments_spin.setValue(DEFAULT_MAX_FRAGMENTS)
+        self.turbo_fragments_spin.setEnabled(False)
+        other_layout.addRow("最大并发分片数:", self.turbo_fragments_spin)
+        
+        self.turbo_chunk_input = QLineEdit()
+        self.turbo_chunk_input.setPlaceholderText("16M")
+        self.turbo_chunk_input.setEnabled(False)
+        other_layout.addRow("最大分块大小:", self.turbo_chunk_input)
+        
+        self.turbo_check.toggled.connect(lambda checked: self.turbo_fragments_spin.setEnabled(checked))
+        self.turbo_check.toggled.connect(lambda checked: self.turbo_chunk_input.setEnabled(checked))
+        
         # 添加Chrome浏览器Cookies选项
         self.chrome_cookies_check = QCheckBox("使用Chrome浏览器Cookies")
         self.chrome_cookies_check.setToolTip("从Chrome浏览器获取Cookies，用于下载需要登录的视频")
         other_layout.addRow("", self.chrome_cookies_check)
         
+        # 日志级别：只有"调试"才让yt-dlp输出详细信息，其他级别下载时不产生调试日志
+        self.log_level_combo = QComboBox()
+        for text, level in (("调试", 'DEBUG'), ("信息", 'INFO'), ("警告", 'WARNING'), ("错误", 'ERROR')):
+            self.log_level_combo.addItem(text, level)
+        self.log_level_combo.setCurrentIndex(self.log_level_combo.findData(LOG_LEVEL))
+        self.log_level_combo.currentIndexChanged.connect(
+            lambda: set_log_level(self.log_level_combo.currentData()))
+        other_layout.addRow("日志级别:", self.log_level_combo)
+        
         other_group.setLayout(other_layout)
         settings_layout.addWidget(other_group)
         
-        settings_layout.addStretch(1)
\ No newline at end of file
+        settings_layout.addStretch(1)
+    
+    def engine_options(self):
+        """并行下载和加速模式相关的任务选项"""
+        options = {'parallel_streams': self.parallel_streams_check.isChecked()}
+        if self.turbo_check.isChecked():
+            options['turbo'] = True
+            options['turbo_max_fragments'] = self.turbo_fragments_spin.value()
+            chunk_size = parse_size(self.turbo_chunk_input.text().strip())
+            if chunk_size:
+                options['turbo_max_chunk_size'] = chunk_size
+        return options
+    
+    def apply_bandwidth_limit(self):
+        """将总带宽设置应用到全局带宽管理器"""
+        limit = None
+        text = self.bandwidth_input.text().strip()
+        if self.bandwidth_check.isChecked() and text:
+            limit = parse_size(text)
+            if not limit:
+                QMessageBox.warning(self, "错误", f"无效的带宽限制: {text}")
+                return
+        bandwidth_manager.set_limit(limit)
\ No newline at end of file
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# 不会再变化的任务状态，可以被清理
+FINISHED_STATUSES = ('completed', 'error', 'cancelled', 'skipped')
+
+
+class TaskStore:
+    """基于SQLite的下载任务存储
+
+    任务状态持久化到磁盘，服务重启后仍可查询；每次更新递增全局版本号，
+    配合version索引可以只查询某个版本之后变化的任务。
+    """
+
+    def __init__(self, db_path=None, retention_days=7, max_finished=1000):
+        """
+        Args:
+            db_path: 数据库文件路径，默认保存在用户目录下
+            retention_days: 已结束任务的保留天数
+            max_finished: 最多保留的已结束任务数
+        """
+        if db_path is None:
+            db_path = os.path.expanduser("~/youtube_downloader_tasks.db")
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_db()
+        self.version = self._conn.execute(
+            "SELECT COALESCE(MAX(version), 0) FROM tasks").fetchone()[0]
+
+    def _init_db(self):
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    message TEXT NOT NULL DEFAULT '',
+                    file_path TEXT,
+                    job_key TEXT,
+                    batch_id TEXT,
+                    progress INTEGER,
+                    version INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # 兼容旧版本数据库
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+            if 'job_key' not in columns:
+                self._conn.execute("ALTER TABLE tasks ADD COLUMN job_key TEXT")
+            if 'batch_id' not in columns:
+                self._conn.execute("ALTER TABLE tasks ADD COLUMN batch_id TEXT")
+            if 'progress' not in columns:
+                self._conn.execute("ALTER TABLE tasks ADD COLUMN progress INTEGER")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    title TEXT,
+                    total INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_version ON tasks(version)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_job_key ON tasks(job_key)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_batch_id ON tasks(batch_id)")
+
+    @staticmethod
+    def _to_dict(row):
+        task = dict(row)
+        task['options'] = json.loads(task['options'])
+        return task
+
+    def create(self, url, options, priority=0, status='queued', message='排队中', job_key=None,
+               batch_id=None):
+        """创建任务并返回任务字典"""
+        task_id = f"task_{uuid.uuid4().hex}"
+        now = time.time()
+        with self._lock, self._conn:
+            self.version += 1
+            self._conn.execute(
+                "INSERT INTO tasks (id, url, options, priority, status, message, job_key, batch_id, "
+                "version, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (task_id, url, json.dumps(options, ensure_ascii=False), priority,
+                 status, message, job_key, batch_id, self.version, now, now))
+        return self.get(task_id)
+
+    def create_batch(self, url, title, total):
+        """创建播放列表/频道批量下载记录，返回批次ID"""
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO batches (id, url, title, total, created_at) VALUES (?, ?, ?, ?, ?)",
+                (batch_id, url, title, total, time.time()))
+        return batch_id
+
+    def get_batch(self, batch_id):
+        """获取批次及其汇总状态，不存在时返回None
+
+        汇总中 counts 为各状态的任务数，progress 为整体完成百分比。
+        """
+        with self._lock:
+            batch = self._conn.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+            if batch is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*), SUM(COALESCE(progress, 0)) FROM tasks "
+                "WHERE batch_id = ? GROUP BY status", (batch_id,)).fetchall()
+        batch = dict(batch)
+        batch['counts'] = {status: count for status, count, _ in rows}
+        # 已结束的任务按100%计，进行中的任务按各自的下载进度计
+        done = sum(count for status, count, _ in rows if status in FINISHED_STATUSES)
+        partial = sum(progress for status, _, progress in rows if status not in FINISHED_STATUSES)
+        batch['progress'] = int((done * 100 + partial) / batch['total']) if batch['total'] else 100
+        return batch
+
+    def find_by_batch(self, batch_id, status=None, limit=None):
+        """按创建顺序返回批次中的任务，可按状态过滤"""
+        query = "SELECT * FROM tasks WHERE batch_id = ?"
+        params = [batch_id]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY created_at, rowid"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def get(self, task_id):
+        """获取单个任务，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def get_many(self, task_ids):
+        """按ID批量获取任务，返回 {task_id: task}"""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return {}
+        placeholders = ','.join('?' * len(task_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM tasks WHERE id IN ({placeholders})", task_ids).fetchall()
+        return {row['id']: self._to_dict(row) for row in rows}
+
+    def update(self, task_id, **fields):
+        """更新任务字段并递增版本号，返回更新后的任务"""
+        if 'options' in fields:
+            fields['options'] = json.dumps(fields['options'], ensure_ascii=False)
+        with self._lock, self._conn:
+            self.version += 1
+            fields['version'] = self.version
+            fields['updated_at'] = time.time()
+            columns = ', '.join(f"{name} = ?" for name in fields)
+            self._conn.execute(
+                f"UPDATE tasks SET {columns} WHERE id = ?", (*fields.values(), task_id))
+        return self.get(task_id)
+
+    def find_active(self, job_key):
+        """查找相同下载内容的排队中或下载中任务，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM tasks WHERE job_key = ? AND status IN ('queued', 'downloading') "
+                "ORDER BY created_at LIMIT 1", (job_key,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def changed_since(self, version):
+        """返回版本号大于version的任务，按版本号升序"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM tasks WHERE version > ? ORDER BY version", (version,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def find_by_status(self, *statuses):
+        """按状态查询任务，按创建时间升序"""
+        placeholders = ','.join('?' * len(statuses))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM tasks WHERE status IN ({placeholders}) ORDER BY created_at",
+                statuses).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def prune(self):
+        """清理过期的已结束任务，返回删除的任务数"""
+        cutoff = time.time() - self.retention_days * 86400
+        placeholders = ','.join('?' * len(FINISHED_STATUSES))
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                f"DELETE FROM tasks WHERE status IN ({placeholders}) AND updated_at < ?",
+                (*FINISHED_STATUSES, cutoff)).rowcount
+            # 超出数量上限时删除最早创建的已结束任务
+            deleted += self._conn.execute(
+                f"DELETE FROM tasks WHERE id IN ("
+                f"SELECT id FROM tasks WHERE status IN ({placeholders}) "
+                f"ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (*FINISHED_STATUSES, self.max_finished)).rowcount
+            # 任务都已被清理的批次
+            self._conn.execute(
+                "DELETE FROM batches WHERE id NOT IN ("
+                "SELECT DISTINCT batch_id FROM tasks WHERE batch_id IS NOT NULL)")
+        return deleted
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""多进程模式下worker进程中记录的指标应汇总到API进程的 /metrics"""
+
+import functools
+import http.server
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# 任务、存档等默认保存在用户目录下，测试中使用临时目录
+HOME = tempfile.mkdtemp()
+os.environ['HOME'] = HOME
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import api_server  # noqa: E402
+from process_workers import ProcessWorkerPool  # noqa: E402
+
+
+def _serve(directory):
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _samples(text, name):
+    """指标所有标签组合的样本数之和"""
+    return sum(float(value) for value in re.findall(rf'^{name}_count(?:{{[^}}]*}})? (\S+)$', text, re.M))
+
+
+def _value(text, name):
+    return float(re.search(rf'^{name} (\S+)$', text, re.M).group(1))
+
+
+def test_process_mode_metrics():
+    media_dir = tempfile.mkdtemp()
+    with open(os.path.join(media_dir, 'clip.mp4'), 'wb') as f:
+        f.write(os.urandom(256 * 1024))
+    server = _serve(media_dir)
+    output_dir = tempfile.mkdtemp()
+
+    api_server.worker_pool = ProcessWorkerPool(1)
+    api_server.scheduler.max_workers = 1
+    try:
+        with TestClient(api_server.app) as client:
+            response = client.post('/api/v1/download', json={
+                'url': f'http://127.0.0.1:{server.server_port}/clip.mp4',
+                'format': '最佳质量',
+                'output_dir': output_dir,
+            })
+            task_id = response.json()['task_id']
+            deadline = time.monotonic() + 60
+            while time.monotonic() < deadline:
+                status = client.get(f'/api/v1/status/{task_id}').json()['status']
+                if status in ('completed', 'error', 'cancelled'):
+                    break
+                time.sleep(0.2)
+            assert status == 'completed'
+            text = client.get('/metrics').text
+    finally:
+        api_server.worker_pool = None
+        server.shutdown()
+
+    assert _samples(text, 'vd_extraction_seconds') >= 1
+    assert _samples(text, 'vd_download_seconds') >= 1
+    assert _samples(text, 'vd_postprocess_seconds') >= 1
+    assert _value(text, 'vd_downloaded_bytes_total') >= 256 * 1024
+    # 结束的任务不再计入当前速度
+    assert _value(text, 'vd_download_speed_bytes') == 0
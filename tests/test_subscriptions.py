@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""订阅的增量同步"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subscriptions  # noqa: E402
+
+CHANNEL = 'https://www.youtube.com/@chan'
+
+
+class FakeYoutubeDL:
+    """频道首页展开为两个标签页，每个标签页是一个平铺的视频列表"""
+
+    tabs = {}
+
+    def __init__(self, params=None):
+        self.requested = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def extract_info(self, url, download=False, process=False):
+        self.requested.append(url)
+        if url == CHANNEL:
+            return {'_type': 'playlist', 'title': 'Chan', 'entries': [
+                {'_type': 'url', 'ie_key': 'YoutubeTab', 'url': f'{CHANNEL}/{tab}'} for tab in self.tabs]}
+        videos = self.tabs[url.rsplit('/', 1)[-1]]
+        return {'_type': 'playlist', 'title': url, 'entries': [
+            {'_type': 'url', 'ie_key': 'Youtube', 'id': video, 'url': video, 'title': video}
+            for video in videos]}
+
+
+def test_new_entries_in_later_tab_are_found(tmp_path, monkeypatch):
+    FakeYoutubeDL.tabs = {
+        'videos': [f'v{i}' for i in range(10, 0, -1)],  # 从新到旧
+        'shorts': [f's{i}' for i in range(10, 0, -1)],
+    }
+    monkeypatch.setattr(subscriptions.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    store = subscriptions.SubscriptionStore(str(tmp_path / 'subscriptions.db'))
+    subscription = store.add(CHANNEL, {'format': 'best'}, '最佳质量', str(tmp_path))
+
+    result = store.sync(subscription['id'])
+    assert len(result['discovered']) == 20
+    store.commit(subscription['id'], result)
+
+    # 只有第二个标签页有新视频，第一个标签页连续遇到已知条目后不应停止整个频道的同步
+    FakeYoutubeDL.tabs['shorts'][:0] = ['s12', 's11']
+    result = store.sync(subscription['id'])
+    assert [entry['id'] for entry in result['entries']] == ['s11', 's12']
+    # 第一个标签页仍然提前停止，不必翻完
+    assert result['scanned'] == subscriptions.STOP_AFTER_KNOWN + 2 + subscriptions.STOP_AFTER_KNOWN
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+
+# 最小的HTTP分块大小(字节)，档位每提高一级翻倍
+MIN_CHUNK_SIZE = 1024 * 1024
+# 默认的调节上限
+DEFAULT_MAX_FRAGMENTS = 8
+DEFAULT_MAX_CHUNK_SIZE = 16 * 1024 * 1024
+# 初始档位：4个并发分片、4MB分块
+START_LEVEL = 2
+# 吞吐量变化小于该比例时认为没有差别，保持当前档位
+TOLERANCE = 0.05
+# 小于该大小的文件测得的吞吐量误差太大，不参与调节
+MIN_SAMPLE_BYTES = 1024 * 1024
+
+
+class _HostState:
+    def __init__(self):
+        self.level = START_LEVEL
+        self.direction = 1
+        self.moved = False
+        self.last_throughput = None
+
+
+class TurboTuner:
+    """加速模式的并发分片数和分块大小自动调节
+
+    按主机分别记录状态，用爬山法调节"档位"：档位k对应 2**k 个并发分片和
+    MIN_CHUNK_SIZE * 2**k 的分块大小(均不超过上限)。每个文件下载完成后报告测得的吞吐量，
+    比上一次明显提高时继续沿同一方向调整，因调整而明显下降时退回，变化不大时保持。
+    yt-dlp在每个文件开始下载时读取这两个参数，因此调节以文件为单位生效。
+    """
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def settings(level, max_fragments=DEFAULT_MAX_FRAGMENTS, max_chunk_size=DEFAULT_MAX_CHUNK_SIZE):
+        """档位对应的 (并发分片数, 分块大小)"""
+        fragments = max(1, min(max_fragments, 2 ** level))
+        chunk_size = max(MIN_CHUNK_SIZE, min(max_chunk_size, MIN_CHUNK_SIZE * 2 ** level))
+        return fragments, chunk_size
+
+    @classmethod
+    def max_level(cls, max_fragments=DEFAULT_MAX_FRAGMENTS, max_chunk_size=DEFAULT_MAX_CHUNK_SIZE):
+        """两个参数都达到上限的最低档位"""
+        level = 0
+        while cls.settings(level + 1, max_fragments, max_chunk_size) != \
+                cls.settings(level, max_fragments, max_chunk_size):
+            level += 1
+        return level
+
+    def choose(self, host, max_fragments=DEFAULT_MAX_FRAGMENTS, max_chunk_size=DEFAULT_MAX_CHUNK_SIZE):
+        """为即将开始的文件下载选择参数，返回 (档位, 并发分片数, 分块大小)"""
+        with self._lock:
+            state = self._hosts.setdefault(host, _HostState())
+            level = min(state.level, self.max_level(max_fragments, max_chunk_size))
+        return (level, *self.settings(level, max_fragments, max_chunk_size))
+
+    def report(self, host, level, nbytes, elapsed,
+               max_fragments=DEFAULT_MAX_FRAGMENTS, max_chunk_size=DEFAULT_MAX_CHUNK_SIZE):
+        """报告一个文件的下载结果，调整该主机下次使用的档位"""
+        if nbytes < MIN_SAMPLE_BYTES or not elapsed or elapsed <= 0:
+            return
+        throughput = nbytes / elapsed
+        top = self.max_level(max_fragments, max_chunk_size)
+
+        with self._lock:
+            state = self._hosts.setdefault(host, _HostState())
+            # 档位已被其他下载调整过，这个结果不再代表当前档位
+            if level != min(state.level, top):
+                return
+
+            last, state.last_throughput = state.last_throughput, throughput
+            if last is not None and throughput <= last * (1 + TOLERANCE):
+                if throughput >= last * (1 - TOLERANCE):
+                    state.moved = False
+                    return
+                # 明显下降：由上次调整造成时退回去，否则沿当前方向继续探索
+                if state.moved:
+                    state.direction = -state.direction
+
+            next_level = level + state.direction
+            if not 0 <= next_level <= top:
+                # 到达边界后保持不变，下次从另一侧探索
+                state.direction = -state.direction
+                next_level = level
+            state.moved = next_level != level
+            state.level = next_level
+
+
+# 进程内共享的调节器，各下载任务的测量结果共同用于调节
+turbo_tuner = TurboTuner()
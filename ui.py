@@ -9,15 +9,20 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QCheckBox, QFileDialog, QMessageBox, QTabWidget, QTextEdit,
                              QTableWidget, QTableWidgetItem, QHeaderView, QGroupBox, QFormLayout,
                              QApplication)
-from PyQt6.QtCore import Qt, QSize, QMetaObject, QThread
+from PyQt6.QtCore import Qt, QSize, QMetaObject, QThread, QTimer
 from PyQt6.QtGui import QIcon, QFont
 import yt_dlp
 
 from download import YouTubeDownloader
 from download_thread import DownloadThread, AnalyzeThread
+from download_archive import get_archive
+from download_engine import job_key
+from download_journal import get_journal, resume_options
 from custom_events import ShowMessageEvent, UpdateStatusEvent, UpdateVideoInfoEvent, handle_custom_event
 from utils import format_duration, format_size, format_time, get_language_code
 from history_manager import HistoryManager
+from history_model import HistoryModel, create_history_view
+from tabs.batch_tab import BatchTab
 from tabs.history_tab import HistoryTab
 from tabs.settings_tab import SettingsTab
 
@@ -26,16 +31,26 @@ class YoutubeDownloader(QMainWindow):
     def __init__(self):
         super().__init__()
         self.download_threads = {}
-        self.download_history = []
         
-        # 初始化历史记录管理器
+        # 初始化历史记录管理器，表格按需从中分页读取
         self.history_manager = HistoryManager()
-        # 加载历史记录
-        self.load_history()
+        self.history_model = HistoryModel(self.history_manager, self)
+        # 第一次使用下载存档时在后台从历史记录导入，不阻塞启动
+        threading.Thread(target=self.backfill_archive, daemon=True).start()
         self.initUI()
         # 修复自定义事件处理方法的绑定
         # 使用 lambda 函数来正确传递参数
         self.customEvent = lambda event: handle_custom_event(self, event)
+        # 窗口显示后再检查上次未完成的下载
+        QTimer.singleShot(0, self.resume_interrupted_downloads)
+    
+    def backfill_archive(self):
+        try:
+            archive = get_archive()
+            if archive.needs_backfill():
+                archive.backfill(self.history_manager.load_history())
+        except Exception as e:
+            print(f"导入下载存档失败: {str(e)}")
     
     def init_logger(self, log_dir):
         """初始化日志系统"""
@@ -80,7 +95,7 @@ class YoutubeDownloader(QMainWindow):
         
         # 格式选择
         self.format_combo = QComboBox()
-        self.format_combo.addItems(["最佳质量", "仅视频", "仅音频 (MP3)", "仅字幕", "1080p", "720p", "480p", "360p"])
+        self.format_combo.addItems(["最佳质量", "仅视频", "仅音频 (M4A)", "仅音频 (Opus)", "仅音频 (MP3)", "仅字幕", "1080p", "720p", "480p", "360p"])
         toolbar_layout.addWidget(self.format_combo)
         
         # 为系统选择
@@ -128,10 +143,12 @@ class YoutubeDownloader(QMainWindow):
         # 创建标签页
         tabs = QTabWidget()
         all_tab = QWidget()
+        self.batch_tab = BatchTab(self)
         self.history_tab = HistoryTab(self)
         self.settings_tab = SettingsTab(self)
         
         tabs.addTab(all_tab, "全部")
+        tabs.addTab(self.batch_tab, "播放列表")
         tabs.addTab(self.history_tab, "历史记录")
         tabs.addTab(self.settings_tab, "设置")
         
@@ -144,20 +161,8 @@ class YoutubeDownloader(QMainWindow):
         self.video_info.setMaximumHeight(100)
         all_layout.addWidget(self.video_info)
         
-        # 创建下载列表表格
-        self.download_table = QTableWidget(0, 7)
-        self.download_table.setHorizontalHeaderLabels(["", "标题", "时长", "大小", "格式", "分辨率", "来源"])
-        self.download_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)  # 标题列自适应
-        self.download_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        
-        # 设置列宽
-        self.download_table.setColumnWidth(0, 40)  # 图标列
-        self.download_table.setColumnWidth(2, 80)  # 时长列
-        self.download_table.setColumnWidth(3, 80)  # 大小列
-        self.download_table.setColumnWidth(4, 80)  # 格式列
-        self.download_table.setColumnWidth(5, 80)  # 分辨率列
-        self.download_table.setColumnWidth(6, 150)  # 来源列
-        
+        # 创建下载列表表格，与历史记录标签页共用同一个模型
+        self.download_table = create_history_view(self.history_model, self.history_tab.play_history_item)
         all_layout.addWidget(self.download_table)
         
         # 下载按钮和进度条
@@ -190,33 +195,6 @@ class YoutubeDownloader(QMainWindow):
         
         main_layout.addWidget(tabs)
         self.setCentralWidget(main_widget)
-        
-        # 填充示例数据到下载表格
-        self.populate_example_data()
-    
-    def populate_example_data(self):
-        """填充示例数据到下载表格"""
-        # 清空表格
-        self.download_table.setRowCount(0)
-        
-        # 添加到表格
-        for item in self.download_history:
-            row = self.download_table.rowCount()
-            self.download_table.insertRow(row)
-            
-            # 添加播放图标
-            play_btn = QPushButton("▶")
-            play_btn.setMaximumWidth(30)
-            play_btn.clicked.connect(lambda checked, item=item: self.play_item(item))
-            self.download_table.setCellWidget(row, 0, play_btn)
-            
-            # 添加其他数据
-            self.download_table.setItem(row, 1, QTableWidgetItem(item.get('title', '未知')))
-            self.download_table.setItem(row, 2, QTableWidgetItem(item.get('duration', '--:--')))
-            self.download_table.setItem(row, 3, QTableWidgetItem(item.get('size', '未知')))
-            self.download_table.setItem(row, 4, QTableWidgetItem(item.get('format', '未知')))
-            self.download_table.setItem(row, 5, QTableWidgetItem(item.get('resolution', '未知')))
-            self.download_table.setItem(row, 6, QTableWidgetItem(item.get('uploader', '未知')))
     
     def browse_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "选择下载文件夹", self.download_path.text())
@@ -294,14 +272,49 @@ class YoutubeDownloader(QMainWindow):
             QMessageBox.warning(self, "错误", "请输入有效的URL")
             return
         
+        download_path = self.ensure_download_path()
+        if download_path is None:
+            return
+        
+        format_option = self.format_combo.currentText()
+        
+        # 已以相同格式下载过时，不做任何提取直接询问
+        if get_archive().contains(url, format_option):
+            reply = QMessageBox.question(
+                self, "已下载过",
+                "该视频已经以相同格式下载过，是否重新下载？",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                self.status_label.setText("该视频已下载过，已跳过")
+                return
+        
+        ydl_opts = self.build_download_options(url, format_option, download_path)
+        if ydl_opts is None:
+            return  # 用户取消了操作
+        
+        # 相同的视频、格式和下载选项正在下载时不重复下载
+        key = job_key(url, format_option, download_path, ydl_opts)
+        for thread in self.download_threads.values():
+            if thread.job_key == key and thread.is_active:
+                self.status_label.setText("该视频正在以相同格式下载中，无需重复下载")
+                return
+        
+        self.launch_download_thread(url, ydl_opts, key)
+    
+    def ensure_download_path(self):
+        """返回下载目录，不存在时创建；创建失败时提示并返回None"""
         download_path = self.download_path.text()
         if not os.path.exists(download_path):
             try:
                 os.makedirs(download_path)
             except Exception as e:
                 QMessageBox.critical(self, "错误", f"无法创建下载目录: {str(e)}")
-                return
-        
+                return None
+        return download_path
+    
+    def build_download_options(self, url, format_option, download_path):
+        """按设置页的选项准备下载选项，单个视频和批量下载共用；仅字幕模式下用户取消选择语言时返回None"""
         # 准备字幕选项
         subtitle_options = None
         if self.settings_tab.subtitle_check.isChecked():
@@ -329,17 +342,15 @@ class YoutubeDownloader(QMainWindow):
         if hasattr(self.settings_tab, 'chrome_cookies_check'):
             use_chrome_cookies = self.settings_tab.chrome_cookies_check.isChecked()
         
-        # 使用YouTubeDownloader来准备下载选项
-        format_option = self.format_combo.currentText()
         if format_option == "仅字幕":
             selected_langs = self.show_subtitle_options_dialog()
             if not selected_langs:
-                return  # 用户取消了操作
-            else:
-                subtitle_options = {
-                    'languages': selected_langs
-                }
+                return None
+            subtitle_options = {
+                'languages': selected_langs
+            }
         
+        # 使用YouTubeDownloader来准备下载选项
         ydl_opts = YouTubeDownloader.prepare_download_options(
             format_option, 
             download_path, 
@@ -350,9 +361,14 @@ class YoutubeDownloader(QMainWindow):
             enable_logging=True,
             url=url
         )
-        
-        # 创建下载线程
-        download_thread = DownloadThread(url, ydl_opts)
+        ydl_opts.update(self.settings_tab.engine_options())
+        # 下载完成后按格式配置记录到下载存档
+        ydl_opts['archive_profile'] = format_option
+        return ydl_opts
+    
+    def launch_download_thread(self, url, ydl_opts, key=None, job_id=None):
+        """创建并启动下载线程"""
+        download_thread = DownloadThread(url, ydl_opts, job_key=key, job_id=job_id)
         download_thread.progress_signal.connect(self.update_progress)
         download_thread.complete_signal.connect(self.download_complete)
         download_thread.error_signal.connect(self.download_error)
@@ -370,82 +386,77 @@ class YoutubeDownloader(QMainWindow):
         # 启动下载线程
         download_thread.start()
     
-    def update_progress(self, progress_data):
+    def resume_interrupted_downloads(self):
+        """恢复上次程序异常退出时未完成的下载，从 .part 文件断点续传"""
         try:
-            downloaded = progress_data.get('downloaded_bytes', 0)
-            total = progress_data.get('total_bytes', 0) or progress_data.get('total_bytes_estimate', 0)
-            
-            # 确保 total 不为 None 且大于 0
-            if total is not None and total > 0:
-                percent = int(downloaded * 100 / total)
-                self.progress_bar.setValue(percent)
+            journal = get_journal()
+            entries = journal.pending('gui')
+        except Exception as e:
+            print(f"读取下载日志失败: {str(e)}")
+            return
+        if not entries:
+            return
+        
+        reply = QMessageBox.question(
+            self, "继续下载",
+            f"发现 {len(entries)} 个上次未完成的下载，是否继续下载？",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            for entry in entries:
+                journal.remove(entry['job_id'])
+            return
+        
+        for entry in entries:
+            ydl_opts = resume_options(entry)
+            # 日志对象无法持久化，按原输出目录重新配置
+            download_path = os.path.dirname(ydl_opts.get('outtmpl') or '') or self.download_path.text()
+            ydl_opts.update(YouTubeDownloader.configure_logging(download_path, entry['url'], entry['job_id']))
+            self.launch_download_thread(entry['url'], ydl_opts, job_id=entry['job_id'])
+    
+    def _finished_thread_url(self):
+        """发出信号的下载线程对应的URL，恢复的下载与输入框中的URL可能不同"""
+        thread = self.sender()
+        if isinstance(thread, DownloadThread):
+            return thread.url
+        return self.url_input.text().strip()
+    
+    def _finished_thread_format(self):
+        """发出信号的下载线程使用的格式配置名称，恢复的下载使用下载日志中记录的格式，而不是当前选择的格式"""
+        thread = self.sender()
+        if isinstance(thread, DownloadThread) and thread.options.get('archive_profile'):
+            return thread.options['archive_profile']
+        return self.format_combo.currentText()
+    
+    def update_progress(self, record):
+        """显示下载进度，record 为下载线程按固定频率采样的 ProgressRecord"""
+        try:
+            if record.total:
+                self.progress_bar.setValue(record.percent)
                 
                 # 更新状态标签显示下载速度和进度
-                speed = progress_data.get('speed', 0)
-                eta = progress_data.get('eta', 0)
-                
-                status_text = f"下载中: {format_size(downloaded)}/{format_size(total)} "
-                if speed is not None and speed > 0:
-                    status_text += f"- {format_size(speed)}/s "
-                if eta is not None and eta > 0:
-                    status_text += f"- 剩余时间: {format_time(eta)}"
-                
-                self.status_label.setText(status_text)
+                status_text = f"下载中: {format_size(record.downloaded)}/{format_size(record.total)} "
+                if record.speed:
+                    status_text += f"- {format_size(record.speed)}/s "
+                if record.eta:
+                    status_text += f"- 剩余时间: {format_time(record.eta)}"
             else:
                 # 如果没有总大小信息，显示已下载的大小
-                status_text = f"下载中: {format_size(downloaded)} (未知总大小) "
-                speed = progress_data.get('speed', 0)
-                if speed is not None and speed > 0:
-                    status_text += f"- {format_size(speed)}/s"
+                status_text = f"下载中: {format_size(record.downloaded)} (未知总大小) "
+                if record.speed:
+                    status_text += f"- {format_size(record.speed)}/s"
+            
+            # 文本未变化时不触发重绘
+            if status_text != self.status_label.text():
                 self.status_label.setText(status_text)
         except Exception as e:
             print(f"更新进度时出错: {str(e)}")
     
-    def load_history(self):
-        """加载历史记录"""
-        self.download_history = self.history_manager.load_history()
-    
-    def save_history(self):
-        """保存历史记录到文件"""
-        self.history_manager.save_history(self.download_history)
-    
-    
     def download_complete(self, info):
-        url = self.url_input.text().strip()
-        format_option = self.format_combo.currentText()
-        
-        # 使用YouTubeDownloader获取下载结果信息
-        history_item = YouTubeDownloader.get_download_info_from_result(info, format_option)
+        url = self._finished_thread_url()
+        format_option = self._finished_thread_format()
         
-        # 添加时间戳
-        history_item['time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # 添加到表格
-        row = self.history_tab.history_table.rowCount()
-        self.history_tab.history_table.insertRow(row)
-        
-        # 添加播放图标
-        play_btn = QPushButton("▶")
-        play_btn.setMaximumWidth(30)
-        self.history_tab.history_table.setCellWidget(row, 0, play_btn)
-        
-        # 添加其他数据
-        self.history_tab.history_table.setItem(row, 1, QTableWidgetItem(history_item['title']))
-        self.history_tab.history_table.setItem(row, 2, QTableWidgetItem(history_item['duration']))
-        self.history_tab.history_table.setItem(row, 3, QTableWidgetItem(history_item['size']))
-        self.history_tab.history_table.setItem(row, 4, QTableWidgetItem(history_item['format']))
-        self.history_tab.history_table.setItem(row, 5, QTableWidgetItem(history_item['resolution']))
-        self.history_tab.history_table.setItem(row, 6, QTableWidgetItem(history_item['uploader']))
-        
-        # 保存到历史记录列表
-        self.download_history.append(history_item)
-        
-        # 保存历史记录到文件
-        self.save_history()
-        
-        # 更新历史记录表格
-        self.history_tab.populate_history_table()
-        self.populate_example_data()
+        self.record_history(info, format_option)
         
         # 更新UI状态
         self.download_btn.setEnabled(True)
@@ -457,9 +468,22 @@ class YoutubeDownloader(QMainWindow):
         if url in self.download_threads:
             del self.download_threads[url]
     
-    # 添加关闭事件处理，确保退出前保存历史记录
+    def record_history(self, info, format_option):
+        """把下载完成的视频加入历史记录"""
+        # 使用YouTubeDownloader获取下载结果信息
+        history_item = YouTubeDownloader.get_download_info_from_result(info, format_option)
+        
+        # 添加时间戳
+        history_item['time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        # 追加写入历史记录存储，并显示在历史记录表格的最前面
+        history_item['id'] = self.history_manager.append(history_item)
+        self.history_model.prepend(history_item)
+        self.history_tab.add_item(history_item)
+    
+    # 添加关闭事件处理，退出前压缩历史记录存储
     def closeEvent(self, event):
-        self.save_history()
+        self.history_manager.compact()
         event.accept()
         
         # 更新UI状态
@@ -468,7 +492,7 @@ class YoutubeDownloader(QMainWindow):
         self.status_label.setText("下载失败")
         
         # 清理线程引用
-        url = self.url_input.text().strip()
+        url = self._finished_thread_url()
         if url in self.download_threads:
             del self.download_threads[url]
     
@@ -482,7 +506,7 @@ class YoutubeDownloader(QMainWindow):
         self.status_label.setText("下载失败")
         
         # 清理线程引用
-        url = self.url_input.text().strip()
+        url = self._finished_thread_url()
         if url in self.download_threads:
             del self.download_threads[url]
     
@@ -494,7 +518,7 @@ class YoutubeDownloader(QMainWindow):
         self.progress_bar.setValue(0)
         
         # 清理线程引用
-        url = self.url_input.text().strip()
+        url = self._finished_thread_url()
         if url in self.download_threads:
             del self.download_threads[url]
     
@@ -1,6 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import json
+import re
+
+# 匹配常见的YouTube视频链接形式
+YOUTUBE_ID_PATTERN = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)([a-zA-Z0-9_-]{11})'
+)
+
 def format_duration(seconds):
     """格式化视频时长"""
     if not seconds:
@@ -47,4 +55,34 @@ def get_language_code(language_name):
         "英文": "en",
         "日文": "ja"
     }
-    return language_map.get(language_name, None)
\ No newline at end of file
+    return language_map.get(language_name, None)
+
+def normalize_video_key(url):
+    """将视频URL规范化为缓存键，同一视频的不同链接形式得到相同的键"""
+    url = url.strip()
+    match = YOUTUBE_ID_PATTERN.search(url)
+    if match:
+        return f"youtube:{match.group(1)}"
+    return url.split('#')[0]
+
+def parse_size(text):
+    """将 "500K"、"1.5M" 这样的大小字符串解析为字节数，无法解析时返回None"""
+    if text is None:
+        return None
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGkmg]?)(?:i?B)?\s*', str(text))
+    if not match:
+        return None
+    number, unit = match.groups()
+    multiplier = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[unit.upper()]
+    return int(float(number) * multiplier)
+
+def serializable_options(options):
+    """去掉日志对象、钩子函数等无法序列化的下载选项"""
+    safe = {}
+    for key, value in options.items():
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        safe[key] = value
+    return safe